@@ -7,7 +7,7 @@ from models.base import Base
 from models.product import Product
 from models.category import Category
 from models.user import User
-from models import user, product, commerce
+from models import user, product, commerce, inventory, notification, blob, exchange_rate
 
 config = context.config
 
@@ -0,0 +1,32 @@
+"""products keyset indexes
+
+Revision ID: a1c4e2b7d903
+Revises: 7de326845f73
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c4e2b7d903'
+down_revision: Union[str, Sequence[str], None] = '7de326845f73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_products_price_shmeckles_id', 'products', ['price_shmeckles', 'id'], unique=False)
+    op.create_index('ix_products_price_flurbos_id', 'products', ['price_flurbos', 'id'], unique=False)
+    op.create_index('ix_products_price_credits_id', 'products', ['price_credits', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_price_credits_id', table_name='products')
+    op.drop_index('ix_products_price_flurbos_id', table_name='products')
+    op.drop_index('ix_products_price_shmeckles_id', table_name='products')
@@ -0,0 +1,51 @@
+"""product full text search
+
+Revision ID: c58e0f31a6d2
+Revises: a1c4e2b7d903
+Create Date: 2026-10-18 11:40:07.512930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c58e0f31a6d2'
+down_revision: Union[str, Sequence[str], None] = 'a1c4e2b7d903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индекс заполняется при старте приложения (services.search_service.init_search_index)
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "CREATE TABLE product_search ("
+            "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        op.execute(
+            "CREATE INDEX ix_product_search_document "
+            "ON product_search USING GIN (document)"
+        )
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE products_fts "
+            "USING fts5(name, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_ad AFTER DELETE ON products "
+            "BEGIN DELETE FROM products_fts WHERE rowid = old.id; END"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TABLE product_search")
+    else:
+        op.execute("DROP TRIGGER products_fts_ad")
+        op.execute("DROP TABLE products_fts")
@@ -0,0 +1,41 @@
+"""cart line unique
+
+Revision ID: f41a6c08b2e9
+Revises: e2f7b94c1d58
+Create Date: 2026-10-18 14:21:16.904532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41a6c08b2e9'
+down_revision: Union[str, Sequence[str], None] = 'e2f7b94c1d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Схлопываем возможные дубли строк корзины перед уникальным индексом
+    op.execute(
+        "UPDATE cart_items SET quantity = ("
+        "SELECT sum(ci.quantity) FROM cart_items ci "
+        "WHERE ci.cart_id = cart_items.cart_id AND ci.product_id = cart_items.product_id)"
+    )
+    op.execute(
+        "DELETE FROM cart_items WHERE id NOT IN ("
+        "SELECT min(id) FROM cart_items GROUP BY cart_id, product_id)"
+    )
+    op.execute("DELETE FROM stock_reservations")
+    op.create_index('uq_cart_items_cart_product', 'cart_items', ['cart_id', 'product_id'], unique=True)
+    op.create_index('uq_stock_reservations_cart_product', 'stock_reservations', ['cart_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_stock_reservations_cart_product', table_name='stock_reservations')
+    op.drop_index('uq_cart_items_cart_product', table_name='cart_items')
@@ -1,9 +1,20 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+import jwt
+from fastapi_users import BaseUserManager, exceptions
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
     JWTStrategy,
 )
+from fastapi_users.jwt import decode_jwt
+from sqlalchemy.orm import make_transient_to_detached
+
+from core.cache import user_cache
 from core.config import settings
+from models.user import User
 
 SECRET = settings.secret_key
 
@@ -15,12 +26,71 @@ cookie_transport = CookieTransport(
 )
 
 
+def _user_snapshot(user: User) -> Dict[str, Any]:
+    return {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+
+
+def _user_from_snapshot(snapshot: Dict[str, Any]) -> User:
+    # Каждому запросу — свой объект: его можно добавить в сессию запроса
+    # как уже существующую строку, не мешая другим запросам
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Сбрасывает все закэшированные токены пользователя"""
+    user_cache.invalidate_tags(f"user:{user_id}")
+
+
+class CachedJWTStrategy(JWTStrategy[User, int]):
+    """
+    JWTStrategy с кэшем пользователя по токену: в обычном случае
+    аутентифицированный запрос обходится без SELECT из users.
+    Запись живёт не дольше USER_CACHE_TTL и не дольше самого токена.
+    """
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, int]
+    ) -> Optional[User]:
+        if token is None:
+            return None
+
+        key = hashlib.sha256(token.encode()).digest()
+        snapshot = user_cache.get(key)
+        if snapshot is not None:
+            return _user_from_snapshot(snapshot)
+
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+            user_id = data.get("sub")
+            if user_id is None:
+                return None
+        except jwt.PyJWTError:
+            return None
+
+        try:
+            parsed_id = user_manager.parse_id(user_id)
+            user = await user_manager.get(parsed_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+        ttl = settings.user_cache_ttl
+        if data.get("exp") is not None:
+            ttl = min(ttl, data["exp"] - time.time())
+        if ttl > 0:
+            user_cache.set(key, _user_snapshot(user), tags=[f"user:{user.id}"], ttl=ttl)
+        return user
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return CachedJWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 
 auth_backend = AuthenticationBackend(
     name="jwt",
     transport=cookie_transport,  # ✅ Токен в куках!
     get_strategy=get_jwt_strategy,
-)
\ No newline at end of file
+)
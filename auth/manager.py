@@ -1,11 +1,15 @@
-from typing import AsyncGenerator, Optional
+from typing import Any, AsyncGenerator, Dict, Optional
 
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, IntegerIDMixin
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager, IntegerIDMixin, exceptions, schemas
 
+from auth.backend import invalidate_user_cache
 from auth.database import get_user_db
+from auth.password import password_helper
 from core.config import settings
 from models.user import User
+from services.cart_service import delete_user_carts_service
 
 SECRET = settings.secret_key
 
@@ -14,6 +18,67 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    # Те же create/authenticate/_update, что в BaseUserManager, но bcrypt
+    # выполняется в пуле потоков auth.password, а не в event loop
+
+    async def create(
+        self,
+        user_create: schemas.UC,
+        safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> User:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await password_helper.hash_async(password)
+
+        created_user = await self.user_db.create(user_dict)
+
+        await self.on_after_register(created_user, request)
+
+        return created_user
+
+    async def authenticate(
+        self,
+        credentials: OAuth2PasswordRequestForm,
+    ) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Хэшируем впустую, чтобы время ответа не выдавало несуществующий email
+            await password_helper.hash_async(credentials.password)
+            return None
+
+        verified, updated_password_hash = await password_helper.verify_and_update_async(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        # Хэш со старым cost factor (BCRYPT_ROUNDS) пересчитан — сохраняем
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
+    async def _update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {
+                **{k: v for k, v in update_dict.items() if k != "password"},
+                "hashed_password": await password_helper.hash_async(password),
+            }
+        return await super()._update(user, update_dict)
+
     async def on_after_register(
         self,
         user: User,
@@ -22,8 +87,47 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
         # здесь можно послать письмо/телеграм, пока просто лог
         print(f"Новый пользователь зарегистрирован: {user.id} {user.email}")
 
+    # Любое изменение пользователя (профиль, пароль, is_active, верификация)
+    # сбрасывает его закэшированные токены
+    async def on_after_update(
+        self,
+        user: User,
+        update_dict: Dict[str, Any],
+        request: Optional[Request] = None,
+    ) -> None:
+        invalidate_user_cache(user.id)
+
+    async def on_after_reset_password(
+        self,
+        user: User,
+        request: Optional[Request] = None,
+    ) -> None:
+        invalidate_user_cache(user.id)
+
+    async def on_after_verify(
+        self,
+        user: User,
+        request: Optional[Request] = None,
+    ) -> None:
+        invalidate_user_cache(user.id)
+
+    async def on_before_delete(
+        self,
+        user: User,
+        request: Optional[Request] = None,
+    ) -> None:
+        # корзины удаляем set-based, а не через ORM-каскад по строкам
+        await delete_user_carts_service(user.id, self.user_db.session)
+
+    async def on_after_delete(
+        self,
+        user: User,
+        request: Optional[Request] = None,
+    ) -> None:
+        invalidate_user_cache(user.id)
+
 
 async def get_user_manager(
     user_db=Depends(get_user_db),
 ) -> AsyncGenerator[UserManager, None]:
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
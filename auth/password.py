@@ -0,0 +1,111 @@
+"""
+Хэширование паролей вне event loop.
+
+bcrypt намеренно медленный (десятки миллисекунд), поэтому хэширование
+и проверка идут в отдельном пуле потоков (bcrypt отпускает GIL), а число
+одновременно принятых операций ограничено семафором: всплеск логинов
+ждёт в очереди, а не занимает все потоки и event loop.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi_users.password import PasswordHelper
+from passlib.context import CryptContext
+
+from core.config import settings
+
+
+class PasswordHashingMetrics:
+    """Счётчики операций и времени ожидания в очереди"""
+
+    def __init__(self) -> None:
+        self.operations = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.work_total = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "operations": self.operations,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "wait_avg_ms": round(self.wait_total / self.operations * 1000, 2) if self.operations else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "work_avg_ms": round(self.work_total / self.operations * 1000, 2) if self.operations else 0.0,
+            "workers": settings.password_hash_workers,
+            "concurrency": settings.password_hash_concurrency,
+        }
+
+
+class AsyncPasswordHelper(PasswordHelper):
+    """
+    PasswordHelper fastapi-users с асинхронными hash_async/verify_and_update_async.
+    Синхронные методы базового класса остаются для совместимости.
+    """
+
+    def __init__(self, rounds: int, workers: int, concurrency: int) -> None:
+        super().__init__(
+            CryptContext(
+                schemes=["bcrypt"],
+                deprecated="auto",
+                bcrypt__default_rounds=rounds,
+                # Хэши с меньшим cost помечаются устаревшими и пересчитываются при входе
+                bcrypt__min_rounds=rounds,
+            )
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._limit = asyncio.Semaphore(concurrency)
+        self.metrics = PasswordHashingMetrics()
+
+    async def _run(self, func, *args):
+        metrics = self.metrics
+        queued_at = time.perf_counter()
+
+        def timed():
+            started_at = time.perf_counter()
+            return started_at, func(*args), time.perf_counter()
+
+        metrics.waiting += 1
+        try:
+            await self._limit.acquire()
+        finally:
+            metrics.waiting -= 1
+        metrics.in_flight += 1
+        try:
+            started_at, result, finished_at = await asyncio.get_running_loop().run_in_executor(
+                self._executor, timed
+            )
+        finally:
+            metrics.in_flight -= 1
+            self._limit.release()
+
+        # Ожидание = от постановки в очередь до старта в потоке (семафор + очередь пула)
+        wait = started_at - queued_at
+        metrics.operations += 1
+        metrics.wait_total += wait
+        metrics.wait_max = max(metrics.wait_max, wait)
+        metrics.work_total += finished_at - started_at
+        return result
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update_async(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._run(self.context.verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_helper = AsyncPasswordHelper(
+    rounds=settings.bcrypt_rounds,
+    workers=settings.password_hash_workers,
+    concurrency=settings.password_hash_concurrency,
+)
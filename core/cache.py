@@ -0,0 +1,134 @@
+"""
+In-process кэши с LRU-вытеснением и TTL.
+
+Записи можно помечать тегами (например, "product:5" или "lists"),
+чтобы при изменении данных точечно сбрасывать только то, что от них зависит.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from core.config import settings
+
+# Все созданные кэши — для эндпоинта со статистикой
+CACHES: Dict[str, "TTLCache"] = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, frozenset]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = None,
+    ) -> None:
+        if key in self._data:
+            self._remove(key)
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tags = frozenset(tags)
+        self._data[key] = (expires_at, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Сбрасывает записи по ключам"""
+        for key in keys:
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tags(self, *tags: str) -> None:
+        """Сбрасывает все записи, помеченные хотя бы одним из тегов"""
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self.invalidations += len(self._data)
+        self._data.clear()
+        self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Кэш пользователей по JWT: снимок строки users, тег "user:<id>"
+user_cache = TTLCache(
+    name="users",
+    maxsize=settings.user_cache_size,
+    ttl=settings.user_cache_ttl,
+)
+
+# Кэш каталога: товары по id и страницы списка товаров
+catalog_cache = TTLCache(
+    name="catalog",
+    maxsize=settings.catalog_cache_size,
+    ttl=settings.catalog_cache_ttl,
+)
+
+# Промахи каталога: id, по которым товара нет. Отдельный небольшой кэш —
+# перебор несуществующих id ботами не вытесняет живые записи catalog_cache
+catalog_miss_cache = TTLCache(
+    name="catalog_misses",
+    maxsize=settings.product_not_found_cache_size,
+    ttl=settings.product_not_found_ttl,
+)
@@ -0,0 +1,47 @@
+"""
+Версия каталога — счётчик, который растёт при каждом изменении
+товаров или категорий. На нём построены ETag / Last-Modified.
+
+Счётчик живёт в памяти процесса, поэтому в токен версии входит
+номер интервала TTL кэша каталога: при нескольких воркерах устаревание
+ответов ограничено тем же сроком, что и у catalog_cache.
+"""
+
+import time
+import uuid
+from email.utils import formatdate
+
+from core.config import settings
+
+
+class CatalogVersion:
+    """Монотонный счётчик изменений каталога"""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.counter = 0
+        self.changed_at = time.time()
+
+    def bump(self) -> None:
+        self.counter += 1
+        self.changed_at = time.time()
+
+    def _epoch(self) -> int:
+        return int(time.time() // self.ttl)
+
+    @property
+    def etag(self) -> str:
+        """Сильный ETag текущего состояния каталога"""
+        return f'"{self.boot_id}-{self._epoch()}-{self.counter}"'
+
+    @property
+    def last_modified(self) -> float:
+        return max(self.changed_at, self._epoch() * self.ttl)
+
+    @property
+    def last_modified_http(self) -> str:
+        return formatdate(self.last_modified, usegmt=True)
+
+
+catalog_version = CatalogVersion(ttl=settings.catalog_cache_ttl)
@@ -0,0 +1,130 @@
+"""
+Реестр категорий в памяти процесса.
+
+Категорий мало и они почти не меняются, поэтому все они загружаются
+при старте и дальше берутся отсюда: вложенная категория в ответе товара
+и GET-эндпоинты категорий обходятся без запросов к БД. Реестр обновляют
+маршруты создания / изменения / удаления категорий; изменения других
+воркеров подхватываются периодической перезагрузкой и при промахе.
+
+При промахе дочитываются только недостающие id и только с основной БД
+(реплика может ещё не знать о новой категории). Отсутствующие id ненадолго
+запоминаются, чтобы перебор несуществующих id не ходил в БД на каждый запрос.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import TTLCache
+from core.config import settings
+from core.database import AsyncSessionLocal, ReadOnlySession
+from models.category import Category as CategoryModel
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryEntry(NamedTuple):
+    """Неизменяемый снимок строки categories (схемы читают его как атрибуты)"""
+    id: int
+    name: str
+    description: str
+
+    @classmethod
+    def from_model(cls, category: CategoryModel) -> "CategoryEntry":
+        return cls(category.id, category.name, category.description)
+
+
+class CategoryRegistry:
+    """Все категории по id"""
+
+    def __init__(self) -> None:
+        self._by_id: Dict[int, CategoryEntry] = {}
+        # id, которых не нашлось в основной БД
+        self._misses = TTLCache(
+            name="category_misses",
+            maxsize=settings.category_miss_cache_size,
+            ttl=settings.category_miss_ttl,
+        )
+        self.loaded = False
+
+    def get(self, category_id: int) -> Optional[CategoryEntry]:
+        return self._by_id.get(category_id)
+
+    def all(self) -> List[CategoryEntry]:
+        return sorted(self._by_id.values())
+
+    def set(self, category: CategoryModel) -> CategoryEntry:
+        """Добавляет или обновляет категорию (после коммита)"""
+        entry = self._by_id[category.id] = CategoryEntry.from_model(category)
+        self._misses.invalidate(category.id)
+        return entry
+
+    def remove(self, category_id: int) -> None:
+        self._by_id.pop(category_id, None)
+
+    async def load(self, session: AsyncSession) -> int:
+        """Перечитывает все категории из БД"""
+        result = await session.execute(select(CategoryModel).order_by(CategoryModel.id))
+        self._by_id = {c.id: CategoryEntry.from_model(c) for c in result.scalars()}
+        self.loaded = True
+        return len(self._by_id)
+
+    async def ensure(
+        self,
+        session: AsyncSession,
+        category_ids: Iterable[int],
+        referenced: bool = False,
+    ) -> None:
+        """
+        Гарантирует, что категории есть в реестре: при промахе
+        (категорию создал другой воркер) дочитывает недостающие из основной БД.
+        Сессия чтения (возможно, реплики) заменяется сессией основной БД.
+
+        referenced=True — id взяты из строк товаров (внешний ключ), поэтому
+        запомненные промахи не учитываются: категория точно существует.
+        """
+        missing = [
+            cid for cid in set(category_ids)
+            if cid not in self._by_id and (referenced or self._misses.get(cid) is None)
+        ]
+        if self.loaded and not missing:
+            return
+
+        if isinstance(session, ReadOnlySession):
+            async with AsyncSessionLocal() as primary:
+                await self._fetch(primary, missing)
+        else:
+            await self._fetch(session, missing)
+
+    async def _fetch(self, session: AsyncSession, category_ids: List[int]) -> None:
+        if not self.loaded:
+            await self.load(session)
+        elif category_ids:
+            result = await session.execute(
+                select(CategoryModel).where(CategoryModel.id.in_(category_ids))
+            )
+            for category in result.scalars():
+                self._by_id[category.id] = CategoryEntry.from_model(category)
+        for cid in category_ids:
+            if cid not in self._by_id:
+                self._misses.set(cid, True)
+
+
+category_registry = CategoryRegistry()
+
+
+async def category_registry_refresher(
+    interval: float = settings.category_registry_refresh_interval,
+) -> None:
+    """Фоновая задача: периодически перечитывает категории (изменения других воркеров)"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as session:
+                await category_registry.load(session)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка обновления реестра категорий: {e}")
@@ -10,6 +10,20 @@ class Settings(BaseSettings):
         alias="DATABASE_URL",
     )
 
+    # Реплики только для чтения, через запятую. Локально можно указать
+    # второй файл SQLite (см. scripts/sync_sqlite_replica.py)
+    database_replica_urls: str = Field(
+        "",
+        description="URL реплик БД для чтения, через запятую",
+        alias="DATABASE_REPLICA_URLS",
+    )
+
+    read_your_writes_window: float = Field(
+        5.0,
+        description="Сколько секунд после записи клиент читает с основной БД",
+        alias="READ_YOUR_WRITES_WINDOW",
+    )
+
     tg_bot_key: str = Field(
         ...,
         description="Telegram Bot API Key",
@@ -34,6 +48,206 @@ class Settings(BaseSettings):
         description="SECRET_KEY для JWT аутентификации",
     )
 
+    catalog_cache_size: int = Field(
+        2048,
+        alias="CATALOG_CACHE_SIZE",
+        description="Максимум записей в кэше каталога",
+    )
+
+    catalog_cache_ttl: float = Field(
+        300.0,
+        alias="CATALOG_CACHE_TTL",
+        description="Время жизни записи кэша каталога, сек",
+    )
+
+    product_not_found_ttl: float = Field(
+        10.0,
+        alias="PRODUCT_NOT_FOUND_TTL",
+        description="Сколько кэшировать ответ «товар не найден», сек",
+    )
+    product_not_found_cache_size: int = Field(
+        1024,
+        alias="PRODUCT_NOT_FOUND_CACHE_SIZE",
+        description="Максимум закэшированных ответов «товар не найден»",
+    )
+
+    reservation_ttl: int = Field(
+        900,
+        alias="RESERVATION_TTL",
+        description="Время жизни резерва товара в корзине, сек",
+    )
+
+    reservation_sweep_interval: int = Field(
+        60,
+        alias="RESERVATION_SWEEP_INTERVAL",
+        description="Период очистки просроченных резервов, сек",
+    )
+
+    reservation_sweep_batch: int = Field(
+        1000,
+        alias="RESERVATION_SWEEP_BATCH",
+        description="Сколько просроченных резервов удалять за один DELETE",
+    )
+
+    notify_poll_interval: float = Field(
+        2.0,
+        alias="NOTIFY_POLL_INTERVAL",
+        description="Период опроса outbox уведомлений, сек",
+    )
+
+    notify_batch_size: int = Field(
+        100,
+        alias="NOTIFY_BATCH_SIZE",
+        description="Сколько уведомлений забирать из outbox за раз",
+    )
+
+    notify_rate_per_chat: float = Field(
+        1.0,
+        alias="NOTIFY_RATE_PER_CHAT",
+        description="Сообщений в секунду на один чат (token bucket)",
+    )
+
+    notify_burst: int = Field(
+        3,
+        alias="NOTIFY_BURST",
+        description="Ёмкость token bucket на один чат",
+    )
+
+    notify_max_attempts: int = Field(
+        8,
+        alias="NOTIFY_MAX_ATTEMPTS",
+        description="Попыток отправки до статуса failed",
+    )
+
+    image_workers: int = Field(
+        2,
+        alias="IMAGE_WORKERS",
+        description="Процессов в пуле генерации вариантов изображений",
+    )
+
+    static_cache_entries: int = Field(
+        512,
+        alias="STATIC_CACHE_ENTRIES",
+        description="Максимум файлов в in-memory кэше статики",
+    )
+
+    static_cache_ttl: float = Field(
+        3600.0,
+        alias="STATIC_CACHE_TTL",
+        description="Время жизни файла в кэше статики, сек",
+    )
+
+    static_inline_max_bytes: int = Field(
+        64 * 1024,
+        alias="STATIC_INLINE_MAX_BYTES",
+        description="Файлы не больше этого размера отдаются из памяти, байт",
+    )
+
+    user_cache_size: int = Field(
+        10000,
+        alias="USER_CACHE_SIZE",
+        description="Максимум токенов в кэше пользователей",
+    )
+
+    user_cache_ttl: float = Field(
+        30.0,
+        alias="USER_CACHE_TTL",
+        description="Время жизни записи кэша пользователей, сек",
+    )
+
+    bcrypt_rounds: int = Field(
+        12,
+        alias="BCRYPT_ROUNDS",
+        description="Cost factor bcrypt; старые хэши с меньшим cost пересчитываются при входе",
+    )
+
+    password_hash_workers: int = Field(
+        2,
+        alias="PASSWORD_HASH_WORKERS",
+        description="Потоков для bcrypt (хэширование и проверка паролей)",
+    )
+
+    password_hash_concurrency: int = Field(
+        8,
+        alias="PASSWORD_HASH_CONCURRENCY",
+        description="Сколько операций bcrypt может быть в работе и очереди пула одновременно",
+    )
+
+    reprice_batch: int = Field(
+        1000,
+        alias="REPRICE_BATCH",
+        description="Сколько товаров переоценивать одним UPDATE при смене курсов",
+    )
+    reprice_stale_after: float = Field(
+        300.0,
+        alias="REPRICE_STALE_AFTER",
+        description="Через сколько секунд без прогресса переоценку может продолжить другой воркер",
+    )
+
+    exchange_rate_refresh_interval: float = Field(
+        60.0,
+        alias="EXCHANGE_RATE_REFRESH_INTERVAL",
+        description="Как часто процесс перечитывает актуальные курсы из БД, сек",
+    )
+
+    category_registry_refresh_interval: float = Field(
+        60.0,
+        alias="CATEGORY_REGISTRY_REFRESH_INTERVAL",
+        description="Как часто перечитывать реестр категорий из БД, сек",
+    )
+    category_miss_ttl: float = Field(
+        5.0,
+        alias="CATEGORY_MISS_TTL",
+        description="Сколько помнить, что категории с таким id нет в БД, сек",
+    )
+    category_miss_cache_size: int = Field(
+        1024,
+        alias="CATEGORY_MISS_CACHE_SIZE",
+        description="Сколько отсутствующих id категорий помнить",
+    )
+
+    facet_index_rebuild_interval: float = Field(
+        300.0,
+        alias="FACET_INDEX_REBUILD_INTERVAL",
+        description="Период полной перестройки индекса фасетов каталога, сек",
+    )
+
+    facet_price_buckets: int = Field(
+        10,
+        alias="FACET_PRICE_BUCKETS",
+        description="Число интервалов в гистограмме цен",
+    )
+
+    import_batch_size: int = Field(
+        1000,
+        alias="IMPORT_BATCH_SIZE",
+        description="Сколько строк импорта товаров валидировать и записывать одной пачкой",
+    )
+
+    import_max_errors: int = Field(
+        1000,
+        alias="IMPORT_MAX_ERRORS",
+        description="Сколько ошибок по строкам возвращать в отчёте импорта (остальные только считаются)",
+    )
+
+    blob_gc_interval: int = Field(
+        3600,
+        alias="BLOB_GC_INTERVAL",
+        description="Период сборки мусора в хранилище изображений, сек",
+    )
+
+    blob_gc_grace: int = Field(
+        3600,
+        alias="BLOB_GC_GRACE",
+        description="Сколько неиспользуемый файл хранится до удаления, сек",
+    )
+
+    blob_gc_batch: int = Field(
+        500,
+        alias="BLOB_GC_BATCH",
+        description="Сколько файлов обрабатывать за одну транзакцию GC",
+    )
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -3,6 +3,9 @@
 """
 
 from enum import Enum
+from typing import Dict, Iterable, Literal, Union
+
+import numpy as np
 
 
 class Currency(str, Enum):
@@ -27,7 +30,9 @@ CURRENCY_NAMES = {
 }
 
 # Курсы конвертации (по отношению к Шмекелям)
-# 1 Шмекель = X других валют
+# 1 Шмекель = X других валют.
+# Это курсы по умолчанию: актуальная версия хранится в БД (exchange_rates)
+# и подставляется сюда через set_conversion_rates
 CONVERSION_RATES = {
     Currency.SHMECKLES: 1.0,
     Currency.FLURBOS: 0.65,      # 1 Шмекель = 0.65 Флурбо
@@ -35,6 +40,12 @@ CONVERSION_RATES = {
 }
 
 
+def set_conversion_rates(rates: Dict[Currency, float]) -> None:
+    """Заменяет текущие курсы (словарь меняется на месте)"""
+    CONVERSION_RATES.update(rates)
+    CONVERSION_RATES[Currency.SHMECKLES] = 1.0
+
+
 def convert_price(price_shmeckles: float, target_currency: Currency) -> float:
     """
     Конвертирует цену из шмекелей в целевую валюту.
@@ -52,6 +63,78 @@ def convert_price(price_shmeckles: float, target_currency: Currency) -> float:
     return round(price_shmeckles * CONVERSION_RATES[target_currency], 2)
 
 
+# Режимы округления для пакетной конвертации:
+# half_even — банковское (0.125 -> 0.12), half_up — «школьное» (0.125 -> 0.13)
+Rounding = Literal["half_even", "half_up"]
+
+
+def round_prices(
+    prices: Union[np.ndarray, Iterable[float]],
+    decimals: int = 2,
+    rounding: Rounding = "half_even",
+) -> np.ndarray:
+    """
+    Округляет массив цен за один векторный проход.
+
+    Цена и произведение на курс — двоичные float: 0.7 * 0.65 хранится как
+    0.45499999999999996, и правило для половины к нему не применилось бы.
+    Поэтому значение сначала переводится в младшие единицы (копейки при
+    decimals=2) и прижимается к 6 знакам — остаток двоичной погрешности
+    отбрасывается, настоящая половина становится ровно .5.
+
+    Args:
+        prices: Цены (массив NumPy или любая последовательность чисел)
+        decimals: Число знаков после запятой
+        rounding: "half_even" (банковское) или "half_up" (половина — от нуля)
+
+    Returns:
+        Массив float64 той же длины
+
+    >>> round_prices([0.455, 0.445, 0.125], rounding="half_even").tolist()
+    [0.46, 0.44, 0.12]
+    >>> round_prices([0.455, 0.445, 0.125, -0.125], rounding="half_up").tolist()
+    [0.46, 0.45, 0.13, -0.13]
+    >>> convert_prices([0.7, 1.9, 8.7], Currency.FLURBOS, rounding="half_even").tolist()
+    [0.46, 1.24, 5.66]
+    >>> convert_prices([0.7, 1.9, 8.7], Currency.FLURBOS, rounding="half_up").tolist()
+    [0.46, 1.24, 5.66]
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    scale = 10.0 ** decimals
+    minor = np.round(prices * scale, 6)
+    if rounding == "half_even":
+        return np.round(minor) / scale
+    if rounding == "half_up":
+        return np.copysign(np.floor(np.abs(minor) + 0.5), minor) / scale
+    raise ValueError(f"Неизвестный режим округления: {rounding}")
+
+
+def convert_prices(
+    prices_shmeckles: Union[np.ndarray, Iterable[float]],
+    target_currency: Currency,
+    decimals: int = 2,
+    rounding: Rounding = "half_even",
+) -> np.ndarray:
+    """
+    Пакетная версия convert_price: конвертирует массив цен из шмекелей
+    в целевую валюту одним умножением и округлением, без вызова на каждую цену.
+
+    Args:
+        prices_shmeckles: Цены в шмекелях
+        target_currency: Целевая валюта
+        decimals: Число знаков после запятой
+        rounding: Режим округления (см. round_prices)
+
+    Returns:
+        Массив конвертированных цен
+    """
+    if target_currency not in CONVERSION_RATES:
+        raise ValueError(f"Неизвестная валюта: {target_currency}")
+
+    prices = np.asarray(prices_shmeckles, dtype=np.float64)
+    return round_prices(prices * CONVERSION_RATES[target_currency], decimals, rounding)
+
+
 def format_price(price: float, currency: Currency) -> str:
     """
     Форматирует цену с символом валюты.
@@ -1,22 +1,44 @@
-from typing import AsyncGenerator
+import itertools
+import math
+import time
+from typing import AsyncGenerator, List
+from fastapi import Request
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
+    AsyncEngine,
     AsyncSession,
 )
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.dialects import postgresql, sqlite
 from core.config import settings
 
 # Base для моделей
 Base = declarative_base()
 
-# Создаём движок (ОДИН на всё приложение!)
+# Создаём движок (ОДИН на всё приложение!) — основная БД, все записи идут сюда
 engine = create_async_engine(
     settings.database_url,
     echo=True,  # выключить в продакшене
     future=True,
 )
 
+# Движки реплик только для чтения (если не заданы — читаем с основной БД)
+reader_engines: List[AsyncEngine] = [
+    create_async_engine(url.strip(), echo=True, future=True)
+    for url in settings.database_replica_urls.split(",")
+    if url.strip()
+]
+
+# Чтение без транзакций: ни BEGIN, ни COMMIT не уходят на сервер.
+# Это те же движки (общий пул), но с AUTOCOMMIT на время выдачи соединения
+_primary_reader = engine.execution_options(isolation_level="AUTOCOMMIT")
+_readers = (
+    itertools.cycle([e.execution_options(isolation_level="AUTOCOMMIT") for e in reader_engines])
+    if reader_engines
+    else None
+)
+
 # Фабрика сессий
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -25,6 +47,125 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+class _ReadOnlySyncSession(Session):
+    def flush(self, objects=None) -> None:
+        if self._is_clean():
+            return
+        raise RuntimeError("Сессия только для чтения: изменения не сохраняются")
+
+
+class ReadOnlySession(AsyncSession):
+    """
+    Сессия для чтения. Соединение берётся из пула при первом запросе
+    и возвращается сразу после получения результата (а не в конце запроса),
+    поэтому на время сериализации ответа соединение не занято.
+    Загруженные объекты остаются доступны (expire_on_commit=False).
+    """
+
+    sync_session_class = _ReadOnlySyncSession
+
+    async def _release(self) -> None:
+        # В режиме AUTOCOMMIT это не запрос к БД, а только возврат соединения в пул
+        if self.in_transaction():
+            await self.commit()
+
+    async def execute(self, *args, **kwargs):
+        try:
+            result = await super().execute(*args, **kwargs)
+        except Exception:
+            await self.rollback()
+            raise
+        await self._release()
+        return result
+
+    async def scalar(self, *args, **kwargs):
+        try:
+            result = await super().scalar(*args, **kwargs)
+        except Exception:
+            await self.rollback()
+            raise
+        await self._release()
+        return result
+
+    async def get(self, *args, **kwargs):
+        try:
+            result = await super().get(*args, **kwargs)
+        except Exception:
+            await self.rollback()
+            raise
+        await self._release()
+        return result
+
+
+# Фабрика сессий только для чтения (движок выбирается на каждый запрос)
+ReadSessionLocal = async_sessionmaker(
+    class_=ReadOnlySession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
+# Cookie, пока действует которая, клиент читает с основной БД
+PRIMARY_COOKIE = "db_primary_until"
+
+# До какого момента этот процесс сам читает с основной БД
+# (после записи — чтобы не закэшировать отстающие данные реплики)
+_primary_until = 0.0
+
+
+def mark_primary_write() -> float:
+    """Фиксирует запись: на read_your_writes_window чтения идут на основную БД"""
+    global _primary_until
+    _primary_until = time.time() + settings.read_your_writes_window
+    return _primary_until
+
+
+def get_read_engine(request: Request) -> AsyncEngine:
+    """
+    Движок для чтения: следующая реплика по кругу или основная БД,
+    если реплик нет либо клиент (или этот процесс) недавно что-то записал.
+    """
+    if _readers is None:
+        return _primary_reader
+    now = time.time()
+    if now < _primary_until:
+        return _primary_reader
+    try:
+        if now < float(request.cookies.get(PRIMARY_COOKIE, 0)):
+            return _primary_reader
+    except ValueError:
+        pass
+    return next(_readers)
+
+
+class ReadYourWritesMiddleware:
+    """
+    После успешного изменяющего запроса ставит клиенту cookie, по которой
+    его чтения ближайшие read_your_writes_window секунд идут на основную БД.
+    """
+
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = mark_primary_write()
+                cookie = (
+                    f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={math.ceil(settings.read_your_writes_window)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """Зависимость для получения сессии БД"""
     async with AsyncSessionLocal() as session:
@@ -37,6 +178,24 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Зависимость для GET-эндпоинтов: сессия на реплике (с read-your-writes),
+    без транзакции и без COMMIT в конце. Записывать через неё нельзя.
+    """
+    async with ReadSessionLocal(bind=get_read_engine(request)) as session:
+        yield session
+
+def upsert_insert(session: AsyncSession, table):
+    """
+    INSERT с поддержкой ON CONFLICT для текущего диалекта
+    (у SQLite и Postgres одинаковый API on_conflict_do_update/do_nothing).
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
 async def init_db():
     """Инициализирует БД (создаёт все таблицы)"""
     async with engine.begin() as conn:
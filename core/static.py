@@ -0,0 +1,285 @@
+"""
+Раздача статики (images/, uploads/) с отпечатками содержимого.
+
+URL вида /images/plumbus.<hash>.webp содержит хэш содержимого файла,
+поэтому такой ответ кэшируется клиентом навсегда (Cache-Control: immutable):
+при изменении файла меняется и URL. Запросы без отпечатка по-прежнему
+работают, но требуют ревалидации.
+
+Маленькие файлы отдаются из ограниченного in-memory кэша, большие —
+потоком с диска (через zero-copy, если ASGI-сервер его поддерживает).
+"""
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import stat
+from email.utils import formatdate
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Set, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from core.cache import TTLCache
+from core.catalog_version import catalog_version
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# URL-префикс -> каталог на диске
+STATIC_ROOTS: Dict[str, Path] = {"uploads": Path("uploads"), "images": Path("images")}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+DIGEST_LENGTH = 12
+FINGERPRINT_RE = re.compile(
+    rf"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{{{DIGEST_LENGTH}}})(?P<suffix>\.[A-Za-z0-9]+)$"
+)
+
+# Маленькие горячие файлы: ключ (путь, mtime, размер) -> содержимое
+static_cache = TTLCache(
+    name="static",
+    maxsize=settings.static_cache_entries,
+    ttl=settings.static_cache_ttl,
+)
+
+
+def resolve_static_path(url: str) -> Optional[Path]:
+    """
+    Путь к файлу по его URL ("/uploads/..." или "/images/...").
+    Возвращает None для внешних ссылок и путей за пределами каталогов.
+    """
+    parts = Path(url.lstrip("/")).parts
+    if not parts or parts[0] not in STATIC_ROOTS:
+        return None
+    root = STATIC_ROOTS[parts[0]].resolve()
+    path = root.joinpath(*parts[1:]).resolve()
+    if root not in path.parents or not path.is_file():
+        return None
+    return path
+
+
+class AssetManifest:
+    """
+    Хэши содержимого файлов статики.
+
+    По пути файла хэш хранится вместе с mtime/размером и пересчитывается
+    при их смене (это нужно раздаче). Для asset_url отдельно хранится
+    отображение URL -> хэш: его обновляет любой пересчёт или запись хэша,
+    поэтому сериализация ответа обходится поиском в словаре, без обращений
+    к диску. Смена хэша по URL меняет тело ответов каталога — вместе с ней
+    растёт версия каталога (ETag).
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[int, int, str]] = {}
+        self._urls: Dict[str, str] = {}
+        # URL, хэш которых уже считается в фоне или которых нет на диске
+        self._pending: Set[str] = set()
+        self._missing: Set[str] = set()
+        self._roots: Optional[Dict[str, Path]] = None
+        self._lock = Lock()
+
+    def _url_of(self, path: Path) -> Optional[str]:
+        """URL файла статики по его (разрешённому) пути"""
+        if self._roots is None:
+            self._roots = {prefix: root.resolve() for prefix, root in STATIC_ROOTS.items()}
+        for prefix, root in self._roots.items():
+            if root in path.parents:
+                return f"/{prefix}/{path.relative_to(root).as_posix()}"
+        return None
+
+    def lookup(self, path: Path, st: Optional[os.stat_result] = None) -> Optional[str]:
+        """Хэш из манифеста без чтения файла (None — неизвестен или устарел)"""
+        st = st or os.stat(path)
+        entry = self._entries.get(str(Path(path).resolve()))
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        return None
+
+    def digest(self, path: Path) -> str:
+        """Хэш файла; при необходимости читает файл целиком (вызывать вне event loop)"""
+        st = os.stat(path)
+        cached = self.lookup(path, st)
+        if cached is not None:
+            return cached
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        return self.record(path, hasher.hexdigest(), st)
+
+    def record(self, path: Path, digest: str, st: Optional[os.stat_result] = None) -> str:
+        """Запоминает уже посчитанный хэш (например, при загрузке файла)"""
+        st = st or os.stat(path)
+        digest = digest[:DIGEST_LENGTH]
+        path = Path(path).resolve()
+        url = self._url_of(path)
+        with self._lock:
+            self._entries[str(path)] = (st.st_mtime_ns, st.st_size, digest)
+            if url is not None and self._urls.get(url) != digest:
+                self._urls[url] = digest
+                self._missing.discard(url)
+                catalog_version.bump()
+        return digest
+
+    def url_digest(self, url: str) -> Optional[str]:
+        """Хэш файла по его URL — только из памяти"""
+        return self._urls.get(url)
+
+    def schedule(self, url: str) -> None:
+        """Считает хэш файла по URL в пуле потоков — не больше одной задачи на URL"""
+        with self._lock:
+            if url in self._pending or url in self._missing:
+                return
+            self._pending.add(url)
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._digest_url, url)
+        except RuntimeError:
+            self._pending.discard(url)
+
+    def _digest_url(self, url: str) -> None:
+        try:
+            path = resolve_static_path(url)
+            if path is None:
+                self._missing.add(url)
+            else:
+                digest = self.digest(path)
+                # Неканонический URL (// или ./ в пути) запоминаем как есть
+                with self._lock:
+                    self._urls.setdefault(url, digest)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось посчитать хэш {url}: {e}")
+        finally:
+            self._pending.discard(url)
+
+    def warm(self) -> int:
+        """Считает хэши всех файлов в каталогах статики"""
+        count = 0
+        for root in STATIC_ROOTS.values():
+            if not root.exists():
+                continue
+            for path in root.resolve().rglob("*"):
+                if path.is_file() and not path.name.startswith("."):
+                    self.digest(path)
+                    count += 1
+        return count
+
+
+asset_manifest = AssetManifest()
+
+
+def asset_url(url: Optional[str]) -> Optional[str]:
+    """
+    URL с отпечатком содержимого для /images/... и /uploads/...
+    Остальные ссылки возвращаются как есть. Если хэш файла ещё не посчитан,
+    возвращается исходный URL, а хэш считается в фоне (одна задача на файл).
+    Вызывается при каждой сериализации ответа, поэтому к диску не обращается.
+    """
+    if not url:
+        return url
+    key = "/" + url.lstrip("/")
+    if key.split("/", 2)[1] not in STATIC_ROOTS:
+        return url
+
+    digest = asset_manifest.url_digest(key)
+    if digest is None:
+        asset_manifest.schedule(key)
+        return url
+
+    head, _, name = url.rpartition("/")
+    stem, dot, suffix = name.rpartition(".")
+    if not dot:
+        return url
+    return f"{head}/{stem}.{digest}.{suffix}"
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse, который отдаёт файл расширением ASGI "http.response.zerocopy"
+    (sendfile на стороне сервера), если сервер его поддерживает.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.send_header_only or "http.response.zerocopy" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({"type": "http.response.zerocopy", "file": file, "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles с поддержкой URL с отпечатком и кэшем маленьких файлов"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        expected_digest = None
+        directory, _, name = path.rpartition("/")
+        match = FINGERPRINT_RE.match(name)
+        if match:
+            expected_digest = match["digest"]
+            name = match["stem"] + match["suffix"]
+            path = f"{directory}/{name}" if directory else name
+
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+
+        digest = await anyio.to_thread.run_sync(asset_manifest.digest, Path(full_path))
+        # Неверный отпечаток (файл изменился) — отдаём актуальное, но без immutable
+        cache_control = IMMUTABLE if expected_digest == digest else REVALIDATE
+        return await self.digest_response(full_path, stat_result, digest, cache_control, scope)
+
+    async def digest_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        digest: str,
+        cache_control: str,
+        scope: Scope,
+    ) -> Response:
+        headers = {
+            "etag": f'"{digest}"',
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": cache_control,
+        }
+        if self.is_not_modified(Headers(headers), Headers(scope=scope)):
+            return NotModifiedResponse(Headers(headers))
+
+        if stat_result.st_size > settings.static_inline_max_bytes:
+            return ZeroCopyFileResponse(
+                full_path,
+                headers=headers,
+                stat_result=stat_result,
+                method=scope["method"],
+            )
+
+        key = (full_path, stat_result.st_mtime_ns, stat_result.st_size)
+        content = static_cache.get(key)
+        if content is None:
+            content = await anyio.Path(full_path).read_bytes()
+            static_cache.set(key, content)
+
+        if scope["method"] == "HEAD":
+            content = b""
+        return Response(
+            content,
+            media_type=mimetypes.guess_type(full_path)[0] or "application/octet-stream",
+            headers={**headers, "content-length": str(stat_result.st_size)},
+        )
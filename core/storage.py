@@ -1,81 +1,271 @@
+"""
+Content-addressed хранилище загруженных изображений.
+
+Файл называется SHA-256 своего содержимого и лежит в шардированном каталоге
+uploads/products/ab/cd/<sha256>.<ext>, поэтому одинаковые картинки хранятся
+один раз. Учёт ссылок и сборка мусора — services.media_service.
+"""
+
 import os
-import uuid
+import hashlib
 import logging
+import tempfile
+import time
 from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from core.static import asset_manifest
 
 logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = Path("uploads/products")
+UPLOAD_URL = "/uploads/products"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Производные изображения (миниатюры, WebP/AVIF)
+VARIANTS_DIR = Path("uploads/variants")
+VARIANTS_URL = "/uploads/variants"
+VARIANTS_DIR.mkdir(parents=True, exist_ok=True)
+
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+CHUNK_SIZE = 64 * 1024  # читаем загрузку кусками по 64KB
+# Запас на границы и заголовки multipart сверх самого файла
+MULTIPART_OVERHEAD = 64 * 1024
+TEMP_PREFIX = ".upload-"
+
+
+class StagedUpload(NamedTuple):
+    """Загрузка, записанная во временный файл, но ещё не опубликованная"""
+    digest: str
+    ext: str
+    size: int
+    tmp_path: str
+
+
+def _too_large_response() -> JSONResponse:
+    return JSONResponse(
+        {"detail": f"Файл слишком большой (макс {MAX_FILE_SIZE // 1024 // 1024}MB)"},
+        status_code=413,
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Ограничивает тело запросов загрузки изображений (POST .../upload-image)
+    до того, как его примет multipart-парсер: по Content-Length — сразу, без
+    чтения тела; без него (chunked) — считая байты по мере приёма. На превышении
+    приложение видит разрыв соединения, а клиент получает 413.
+    """
+
+    PATH_SUFFIX = "/upload-image"
+
+    def __init__(self, app, max_body: int = MAX_FILE_SIZE + MULTIPART_OVERHEAD) -> None:
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].endswith(self.PATH_SUFFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        length = Headers(scope=scope).get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            await _too_large_response()(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message) -> None:
+            nonlocal started
+            # Ответ приложения на оборванное тело заменяем на 413
+            if exceeded and not started:
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not started:
+            await _too_large_response()(scope, receive, send)
+
+
+def sniff_image_extension(header: bytes) -> Optional[str]:
+    """
+    Определяет формат изображения по сигнатуре (magic bytes).
+    Возвращает расширение или None, если это не поддерживаемая картинка.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def blob_path(digest: str, ext: str) -> Path:
+    return UPLOAD_DIR / digest[:2] / digest[2:4] / f"{digest}.{ext}"
+
+
+def blob_url(digest: str, ext: str) -> str:
+    return f"{UPLOAD_URL}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
 
-async def save_product_image(file: UploadFile) -> str:
+
+def _open_temp_file():
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=TEMP_PREFIX, suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def _close_temp_file(tmp_file) -> None:
+    tmp_file.flush()
+    os.fsync(tmp_file.fileno())
+    tmp_file.close()
+
+
+def _unlink(path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stage_image_upload(file: UploadFile) -> StagedUpload:
     """
-    Сохраняет изображение товара и возвращает путь.
+    Записывает загрузку во временный файл и считает её SHA-256.
+
+    Загрузка читается кусками: формат проверяется по сигнатуре первого
+    куска, а не по расширению. Запись идёт в пуле потоков, поэтому память
+    на загрузку постоянна, а event loop не блокируется.
+
+    К этому моменту multipart-парсер Starlette уже принял тело запроса
+    целиком (во временный файл UploadFile), поэтому слишком большое тело
+    отсекает раньше UploadSizeLimitMiddleware; здесь лимит проверяется
+    точно — по размеру самого файла.
     """
-    
+
     # Проверка имени файла
     if not file.filename:
         raise HTTPException(status_code=400, detail="Имя файла отсутствует")
-    
-    # Проверка расширения
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
+
+    first_chunk = await file.read(CHUNK_SIZE)
+    ext = sniff_image_extension(first_chunk)
+    if ext is None:
         raise HTTPException(
             status_code=400,
-            detail=f"Расширение .{ext} не поддерживается. Допустимые: {', '.join(ALLOWED_EXTENSIONS)}"
+            detail=f"Формат файла не поддерживается. Допустимые: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
         )
-    
-    # Читаем содержимое
-    content = await file.read()
-    
-    # Проверка размера
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"Файл слишком большой (макс {MAX_FILE_SIZE // 1024 // 1024}MB)"
-        )
-    
-    # Генерируем уникальное имя
-    unique_id = uuid.uuid4().hex
-    new_filename = f"{unique_id}.{ext}"
-    file_path = UPLOAD_DIR / new_filename
-    
-    # Сохраняем файл
+
+    tmp_file, tmp_path = await run_in_threadpool(_open_temp_file)
     try:
-        with open(file_path, "wb") as f:
-            f.write(content)
-        logger.info(f"✅ Изображение сохранено: {new_filename}")
+        size = 0
+        hasher = hashlib.sha256()
+        chunk = first_chunk
+        while chunk:
+            size += len(chunk)
+            # Проверка размера — до записи, не дочитывая файл целиком
+            if size > MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Файл слишком большой (макс {MAX_FILE_SIZE // 1024 // 1024}MB)"
+                )
+            hasher.update(chunk)
+            await run_in_threadpool(tmp_file.write, chunk)
+            chunk = await file.read(CHUNK_SIZE)
+        await run_in_threadpool(_close_temp_file, tmp_file)
+    except HTTPException:
+        tmp_file.close()
+        await run_in_threadpool(_unlink, tmp_path)
+        raise
     except Exception as e:
+        tmp_file.close()
+        await run_in_threadpool(_unlink, tmp_path)
         logger.exception(f"❌ Ошибка при сохранении файла: {e}")
         raise HTTPException(
             status_code=500,
             detail="Не удалось сохранить изображение"
         )
-    
-    return f"/uploads/products/{new_filename}"
 
-def delete_product_image(image_url: str) -> bool:
+    return StagedUpload(hasher.hexdigest(), ext, size, tmp_path)
+
+
+def publish_staged_upload(staged: StagedUpload) -> Path:
     """
-    Удаляет изображение товара с диска.
-    Возвращает True если файл был удалён.
+    Переносит временный файл на место блоба атомарным переименованием.
+    Одинаковое содержимое всегда попадает в один и тот же файл (дедупликация).
     """
-    if not image_url:
-        return False
-    
-    # Извлекаем имя файла из URL
-    filename = image_url.split("/")[-1]
-    file_path = UPLOAD_DIR / filename
-    
-    try:
-        if file_path.exists():
-            file_path.unlink()
-            logger.info(f"✅ Изображение удалено: {filename}")
-            return True
-    except Exception as e:
-        logger.exception(f"❌ Ошибка при удалении файла: {e}")
-    
-    return False
+    target = blob_path(staged.digest, staged.ext)
+    existed = target.exists()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Даже для существующего блоба переименовываем заново: содержимое то же,
+    # а свежий mtime не даёт GC удалить файл, который только что загрузили
+    os.replace(staged.tmp_path, target)
+    if existed:
+        logger.info(f"♻️ Изображение уже в хранилище: {target.name}")
+    else:
+        logger.info(f"✅ Изображение сохранено: {target.name} ({staged.size} байт)")
+    asset_manifest.record(target, staged.digest)
+    return target
+
+
+def discard_staged_upload(staged: StagedUpload) -> None:
+    _unlink(staged.tmp_path)
+
+
+def delete_blob_files(digest: str, ext: str) -> int:
+    """Удаляет блоб и все его производные изображения. Возвращает число файлов."""
+    return delete_upload_file(blob_path(digest, ext))
+
+
+def iter_stale_files(max_age: float) -> Iterator[Path]:
+    """
+    Файлы хранилища старше max_age секунд: блобы из шардов, загрузки
+    старого формата (uploads/products/<uuid>.<ext>) и брошенные временные
+    файлы. Используется сборщиком мусора.
+    """
+    cutoff = time.time() - max_age
+    for path in [*UPLOAD_DIR.glob("*"), *UPLOAD_DIR.glob("??/??/*")]:
+        if path.is_file() and path.stat().st_mtime < cutoff:
+            yield path
+
+
+def delete_upload_file(path: Path) -> int:
+    """Удаляет файл хранилища и производные изображения с тем же именем"""
+    deleted = 0
+    for target in [path, *VARIANTS_DIR.glob(f"{path.stem}-*")]:
+        try:
+            target.unlink()
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.exception(f"❌ Ошибка при удалении файла {target}: {e}")
+    return deleted
@@ -0,0 +1,37 @@
+from email.utils import parsedate_to_datetime
+
+from fastapi import HTTPException, Request, Response, status
+
+from core.catalog_version import catalog_version
+
+
+async def catalog_conditional_get(request: Request, response: Response) -> None:
+    """
+    Условный GET для каталога.
+
+    Подключается через dependencies=[...] маршрута, поэтому выполняется
+    раньше сессии БД: при совпадении версии сразу отвечаем 304.
+    """
+    etag = catalog_version.etag
+    headers = {
+        "ETag": etag,
+        "Last-Modified": catalog_version.last_modified_http,
+        "Cache-Control": "no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                since = None
+            if since is not None and int(catalog_version.last_modified) <= since:
+                raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
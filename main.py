@@ -1,18 +1,31 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
+from typing import Any, Dict
 from pathlib import Path
 
-from core.database import engine, Base
+from core.database import AsyncSessionLocal, engine, reader_engines, Base, ReadYourWritesMiddleware
 from core.config import settings
+from core.cache import CACHES
+from core.category_registry import category_registry, category_registry_refresher
+from core.static import HashedStaticFiles, asset_manifest
+from core.storage import UploadSizeLimitMiddleware
 from routes.products import router as products_router
 from routes.categories import router as categories_router
 from routes.cart import router as cart_router
 from routes.orders import router as orders_router
+from routes.currencies import router as currencies_router
 from auth import auth_router
+from auth.password import password_helper
+from services.exchange_rate_service import exchange_rate_refresher
+from services.facet_service import facet_index_refresher
+from services.image_service import backfill_image_variants, shutdown_image_pool
+from services.inventory_service import reservation_sweeper
+from services.media_service import blob_gc
+from services.notification_service import notification_worker
+from services.search_service import init_search_index
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +35,36 @@ async def lifespan(app: FastAPI):
     """Инициализация и завершение приложения"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await init_search_index(conn)
     logger.info("✅ Все таблицы созданы!")
+    # Категории держим в памяти: вложенная категория товара берётся отсюда
+    async with AsyncSessionLocal() as session:
+        count = await category_registry.load(session)
+    logger.info(f"✅ Загружено категорий: {count}")
+    categories_task = asyncio.create_task(category_registry_refresher())
+    sweeper = asyncio.create_task(reservation_sweeper())
+    gc_task = asyncio.create_task(blob_gc())
+    # Актуальные курсы из БД (и продолжение прерванной переоценки)
+    rates_task = asyncio.create_task(exchange_rate_refresher())
+    # Индекс фильтров и фасетов каталога (строится при старте, затем периодически)
+    facets_task = asyncio.create_task(facet_index_refresher())
+    notification_worker.start()
+    # Варианты изображений для товаров без них (seed, старые загрузки)
+    backfill = asyncio.create_task(backfill_image_variants())
+    # Хэши статики для URL с отпечатками считаем заранее, вне event loop
+    asyncio.get_running_loop().run_in_executor(None, asset_manifest.warm)
     yield
+    sweeper.cancel()
+    categories_task.cancel()
+    gc_task.cancel()
+    rates_task.cancel()
+    facets_task.cancel()
+    backfill.cancel()
+    await notification_worker.stop()
+    shutdown_image_pool()
+    password_helper.shutdown()
+    for reader in reader_engines:
+        await reader.dispose()
     logger.info("🛑 Приложение остановлено")
 
 
@@ -34,6 +75,10 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Слишком большие загрузки изображений отсекаются до разбора multipart
+# (добавляется раньше CORS — чтобы ответ 413 тоже получил CORS-заголовки)
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # ✅ CORS CONFIGURATION - ИСПРАВЛЕНО!
 app.add_middleware(
     CORSMiddleware,
@@ -46,22 +91,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+# Чтения клиента сразу после его записи идут на основную БД, а не на реплику
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Подключаем роутеры
 app.include_router(products_router, prefix="/api")
 app.include_router(categories_router, prefix="/api")
 app.include_router(cart_router, prefix="/api")
 app.include_router(orders_router, prefix="/api")
+app.include_router(currencies_router, prefix="/api")
 app.include_router(auth_router)
 
 images_dir = Path("images")
 if images_dir.exists():
-    app.mount("/images", StaticFiles(directory="images"), name="images")
+    app.mount("/images", HashedStaticFiles(directory="images"), name="images")
 
 # Статические файлы
 try:
-    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+    app.mount("/uploads", HashedStaticFiles(directory="uploads"), name="uploads")
     logger.info("✅ Статические файлы подключены")
 except Exception as e:
     logger.warning(f"⚠️ Не удалось подключить статические файлы: {e}")
@@ -77,6 +127,18 @@ async def root() -> Dict[str, str]:
     }
 
 
+@app.get("/api/metrics/password-hashing")
+async def password_hashing_metrics() -> Dict[str, Any]:
+    """Очередь bcrypt: число операций, ожидание в очереди и время работы"""
+    return password_helper.metrics.stats()
+
+
+@app.get("/api/metrics/cache")
+async def cache_metrics() -> Dict[str, Dict[str, Any]]:
+    """Статистика in-process кэшей (попадания, промахи, вытеснения)"""
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import Integer, String, TIMESTAMP, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+class ImageBlob(Base):
+    """Загруженный файл в content-addressed хранилище (имя = SHA-256 содержимого)"""
+    __tablename__ = "image_blobs"
+    __table_args__ = (
+        # Выборка кандидатов для сборщика мусора
+        Index("ix_image_blobs_ref_count_updated", "ref_count", "updated_at"),
+    )
+    
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    url: Mapped[str] = mapped_column(String(500), nullable=False, unique=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Сколько товаров ссылается на файл
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+    # Последнее обращение (загрузка или смена счётчика) — для grace-периода GC
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+    )
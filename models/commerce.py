@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Integer, String, ForeignKey, TIMESTAMP, func, Float
+from sqlalchemy import Integer, String, ForeignKey, TIMESTAMP, func, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from core.database import Base
 
@@ -13,6 +13,7 @@ class Cart(Base):
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False,
+        unique=True,  # одна корзина на пользователя (как в миграции 7de326845f73)
         index=True
     )
     created_at: Mapped[datetime] = mapped_column(
@@ -37,6 +38,10 @@ class Cart(Base):
 class CartItem(Base):
     """Товар в корзине"""
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # Одна строка на товар в корзине — цель для INSERT ... ON CONFLICT
+        Index("uq_cart_items_cart_product", "cart_id", "product_id", unique=True),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     cart_id: Mapped[int] = mapped_column(
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Integer, Float, String, TIMESTAMP, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+class ExchangeRate(Base):
+    """
+    Версия курсов валют (сколько единиц валюты за 1 шмекель).
+    Каждое изменение курсов — новая строка; цены каталога пересчитывает
+    фоновая переоценка, её прогресс хранится здесь же.
+    """
+    __tablename__ = "exchange_rates"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    rate_flurbos: Mapped[float] = mapped_column(Float, nullable=False)
+    rate_credits: Mapped[float] = mapped_column(Float, nullable=False)
+
+    # pending -> repricing -> applied / superseded (появилась версия новее)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    total_products: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    repriced_products: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Чекпойнт переоценки: товары с id <= last_product_id уже пересчитаны
+    last_product_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Когда воркер, ведущий переоценку, последний раз сохранял прогресс
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=True
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now()
+    )
+    applied_at: Mapped[Optional[datetime]] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=True
+    )
@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy import Integer, ForeignKey, TIMESTAMP, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+class StockReservation(Base):
+    """Временный резерв товара под корзину (журнал холдов)"""
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        # Покрывающий индекс для расчёта доступного остатка по товару
+        Index(
+            "ix_stock_reservations_product_expires",
+            "product_id",
+            "expires_at",
+            "quantity",
+        ),
+        # Один холд на строку корзины — продлевается upsert'ом
+        Index("uq_stock_reservations_cart_product", "cart_id", "product_id", unique=True),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    product_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("products.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    cart_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("carts.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        index=True
+    )
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Integer, String, Text, TIMESTAMP, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+class NotificationOutbox(Base):
+    """Исходящее уведомление в Telegram (outbox)"""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        # Выборка очередной пачки: статус + срок следующей попытки
+        Index("ix_notification_outbox_status_next", "status", "next_attempt_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    chat_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    parse_mode: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    # pending -> sending -> sent / failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now()
+    )
+    sent_at: Mapped[Optional[datetime]] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=True
+    )
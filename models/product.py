@@ -1,5 +1,5 @@
 from typing import Optional
-from sqlalchemy import Integer, String, Float, ForeignKey, Text
+from sqlalchemy import Integer, String, Float, ForeignKey, Text, Index, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.database import Base
@@ -7,6 +7,12 @@ from core.database import Base
 class Product(Base):
     """Товар в магазине"""
     __tablename__ = "products"
+    __table_args__ = (
+        # Составные индексы под keyset-пагинацию: (цена, id)
+        Index("ix_products_price_shmeckles_id", "price_shmeckles", "id"),
+        Index("ix_products_price_flurbos_id", "price_flurbos", "id"),
+        Index("ix_products_price_credits_id", "price_credits", "id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
@@ -22,7 +28,12 @@ class Product(Base):
     price_shmeckles: Mapped[float] = mapped_column(Float, nullable=False)
     price_flurbos: Mapped[float] = mapped_column(Float, nullable=False)
     price_credits: Mapped[float] = mapped_column(Float, nullable=False)
+
+    # Остаток на складе (колонка добавлена миграцией 7de326845f73)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=10, server_default="10")
     
     image_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    # Производные изображения: {"webp": {"320": "/uploads/variants/..."}, ...}
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSON(none_as_null=True), nullable=True)
     
     category: Mapped["Category"] = relationship("Category", back_populates="products")
@@ -1,34 +1,47 @@
 # routes/cart.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.currencies import Currency
 from core.database import get_async_session
 from models.commerce import Cart
-from schemas.commerce import CartRead, CartItemCreate
+from schemas.commerce import CartRead, CartItemCreate, CartBatchRequest, CartBatchResult
 from auth import current_active_user
 
 from services.cart_service import (
     get_or_create_cart_service,
     add_item_to_cart_service,
+    apply_cart_batch_service,
     delete_cart_item_service,
     clear_cart_service,
 )
+from services.currency_service import localize_cart
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
+# Общий параметр всех ответов с корзиной
+DISPLAY_CURRENCY = Query(
+    None,
+    description="Валюта, в которой вернуть цены позиций и итог корзины",
+)
+
 
 @router.get("", response_model=CartRead)
 async def get_cart(
+    display_currency: Optional[Currency] = DISPLAY_CURRENCY,
     user=Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     cart = await get_or_create_cart_service(user.id, session)
-    return cart
+    return localize_cart(cart, display_currency)
 
 
 @router.post("/items", response_model=CartRead, status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
     payload: CartItemCreate,
+    display_currency: Optional[Currency] = DISPLAY_CURRENCY,
     user=Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
@@ -36,12 +49,27 @@ async def add_item_to_cart(
         cart = await add_item_to_cart_service(user.id, payload, session)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    return cart
+    return localize_cart(cart, display_currency)
+
+
+@router.patch("/items", response_model=CartBatchResult)
+async def apply_cart_batch(
+    payload: CartBatchRequest,
+    display_currency: Optional[Currency] = DISPLAY_CURRENCY,
+    user=Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        cart, errors = await apply_cart_batch_service(user.id, payload, session)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"cart": localize_cart(cart, display_currency), "errors": errors}
 
 
 @router.delete("/items/{item_id}", response_model=CartRead)
 async def delete_item(
     item_id: int,
+    display_currency: Optional[Currency] = DISPLAY_CURRENCY,
     user=Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
@@ -49,13 +77,14 @@ async def delete_item(
         cart = await delete_cart_item_service(user.id, item_id, session)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    return cart
+    return localize_cart(cart, display_currency)
 
 
 @router.delete("", response_model=CartRead)
 async def clear_cart(
+    display_currency: Optional[Currency] = DISPLAY_CURRENCY,
     user=Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     cart = await clear_cart_service(user.id, session)
-    return cart
+    return localize_cart(cart, display_currency)
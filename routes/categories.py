@@ -1,10 +1,19 @@
 from typing import List
 from fastapi import APIRouter, HTTPException, Path, status, Depends
-from sqlalchemy import select
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.database import get_async_session
+from core.catalog_version import catalog_version
+from core.category_registry import category_registry
+from core.database import get_async_session, get_read_session
+from dependencies.http_cache import catalog_conditional_get
 from models.category import Category as CategoryModel
+from models.product import Product as ProductModel
 from schemas.category import CategoryCreate, CategoryRead
+from services.cart_service import delete_product_cart_lines_service
+from services.facet_service import facet_index
+from services.media_service import release_product_images
+from services.product_service import invalidate_category_cache
 
 router = APIRouter(
     prefix="/categories",
@@ -21,23 +30,21 @@ async def create_category(
     category_data: CategoryCreate,
     session: AsyncSession = Depends(get_async_session),
 ):
-    # Проверяем уникальность имени
-    stmt = select(CategoryModel).where(
-        CategoryModel.name == category_data.name
-    )
-    result = await session.execute(stmt)
-    existing = result.scalar_one_or_none()
-    
-    if existing:
+    # Уникальность имени проверяет сама БД (unique-индекс), без отдельного SELECT
+    try:
+        category = await session.scalar(
+            insert(CategoryModel)
+            .values(**category_data.model_dump())
+            .returning(CategoryModel)
+        )
+    except IntegrityError:
         raise HTTPException(
             status_code=400,
             detail="Категория с таким именем уже существует",
         )
-    
-    category = CategoryModel(**category_data.model_dump())
-    session.add(category)
     await session.commit()
-    await session.refresh(category)
+    category_registry.set(category)
+    catalog_version.bump()
     
     return category
 
@@ -45,25 +52,25 @@ async def create_category(
     "/",
     response_model=List[CategoryRead],
     summary="Получить список категорий",
+    dependencies=[Depends(catalog_conditional_get)],
 )
-async def get_categories(
-    session: AsyncSession = Depends(get_async_session),
-):
-    stmt = select(CategoryModel).order_by(CategoryModel.id)
-    result = await session.execute(stmt)
-    categories = result.scalars().all()
-    return categories
+async def get_categories():
+    # Из реестра в памяти, без запроса к БД
+    return category_registry.all()
 
 @router.get(
     "/{category_id}",
     response_model=CategoryRead,
     summary="Получить категорию по ID",
+    dependencies=[Depends(catalog_conditional_get)],
 )
 async def get_category(
     category_id: int = Path(..., ge=1, description="ID категории"),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    category = await session.get(CategoryModel, category_id)
+    # Промах реестра — возможно, категорию только что создал другой воркер
+    await category_registry.ensure(session, [category_id])
+    category = category_registry.get(category_id)
     if category is None:
         raise HTTPException(status_code=404, detail="Категория не найдена")
     return category
@@ -78,13 +85,24 @@ async def update_category(
     category_data: CategoryCreate,
     session: AsyncSession = Depends(get_async_session),
 ):
-    category = await session.get(CategoryModel, category_id)
+    try:
+        category = await session.scalar(
+            update(CategoryModel)
+            .where(CategoryModel.id == category_id)
+            .values(name=category_data.name)
+            .returning(CategoryModel)
+        )
+    except IntegrityError:
+        raise HTTPException(
+            status_code=400,
+            detail="Категория с таким именем уже существует",
+        )
     if category is None:
         raise HTTPException(status_code=404, detail="Категория не найдена")
-    
-    category.name = category_data.name
+
     await session.commit()
-    await session.refresh(category)
+    category_registry.set(category)
+    invalidate_category_cache(category_id)
     return category
 
 @router.delete(
@@ -100,5 +118,18 @@ async def delete_category(
     if category is None:
         raise HTTPException(status_code=404, detail="Категория не найдена")
     
-    await session.delete(category)
+    # Товары категории и их строки в корзинах удаляем set-based,
+    # не загружая связанные объекты в ORM
+    product_ids = select(ProductModel.id).where(ProductModel.category_id == category_id)
+    await delete_product_cart_lines_service(product_ids, session)
+    # Файлы изображений удалит GC, когда на них не останется ссылок
+    await release_product_images(session, product_ids)
+    await session.execute(
+        delete(ProductModel).where(ProductModel.category_id == category_id)
+    )
+    await session.execute(delete(CategoryModel).where(CategoryModel.id == category_id))
     await session.commit()
+    category_registry.remove(category_id)
+    # Товары категории удалены — меняются и страницы списка
+    invalidate_category_cache(category_id, lists=True)
+    facet_index.remove_category(category_id)
@@ -0,0 +1,56 @@
+# routes/currencies.py
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_async_session, get_read_session
+from schemas.exchange_rate import ExchangeRateCreate, ExchangeRateRead
+
+from services.exchange_rate_service import (
+    create_exchange_rate_service,
+    get_exchange_rate_service,
+    get_exchange_rates_service,
+    schedule_repricing,
+)
+
+router = APIRouter(prefix="/exchange-rates", tags=["Currencies"])
+
+
+@router.get("", response_model=List[ExchangeRateRead], summary="История курсов валют")
+async def get_exchange_rates(
+    session: AsyncSession = Depends(get_read_session),
+):
+    return await get_exchange_rates_service(session)
+
+
+@router.post(
+    "",
+    response_model=ExchangeRateRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Задать новые курсы и переоценить каталог",
+)
+async def create_exchange_rate(
+    payload: ExchangeRateCreate,
+    session: AsyncSession = Depends(get_async_session),
+):
+    rate = await create_exchange_rate_service(session, payload)
+    # Фоновая переоценка читает версию из БД — коммитим до её запуска
+    await session.commit()
+    schedule_repricing(rate.id)
+    return rate
+
+
+@router.get(
+    "/{rate_id}",
+    response_model=ExchangeRateRead,
+    summary="Версия курсов и прогресс переоценки",
+)
+async def get_exchange_rate(
+    rate_id: int = Path(..., ge=1),
+    session: AsyncSession = Depends(get_read_session),
+):
+    try:
+        return await get_exchange_rate_service(session, rate_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -1,4 +1,5 @@
-from typing import List, Optional
+import io
+from typing import Callable, List, Optional
 
 import logging
 from fastapi import (
@@ -7,31 +8,45 @@ from fastapi import (
     Depends,
     Path,
     Query,
-    BackgroundTasks,
     UploadFile,
     Body,
+    Request,
+    Response,
 )
+from fastapi.responses import RedirectResponse
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import update  
 from sqlalchemy.orm import selectinload  
 
 
-from schemas import Product, ProductCreate
-from core.database import get_async_session
-from core.storage import save_product_image, delete_product_image
+from schemas import Product, ProductCreate, ProductFacets, ProductImportResult
+from core.category_registry import category_registry
+from core.config import settings
+from core.currencies import Currency
+from core.database import get_async_session, get_read_session
+from core.static import asset_url
+from dependencies.http_cache import catalog_conditional_get
 from models.product import Product as ProductModel
 
-from utils.telegram import send_telegram_message
-from utils.products import product_get_by_id
-
 from services.product_service import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
     get_all_products_service,
+    get_product_facets_service,
     get_product_by_id_service,
+    get_product_row,
     create_product_service,
     update_product_service,
     delete_product_service,
+    invalidate_product_cache,
 )
+from services.currency_service import localize_products
+from services.image_service import schedule_image_backfill, schedule_image_variants
+from services.import_service import detect_format, import_products
+from services.media_service import release_image, retain_image, save_product_image
+from utils.images import select_image_variant
+from utils.telegram import escape_md
 
 
 logger = logging.getLogger(__name__)
@@ -42,41 +57,133 @@ router = APIRouter(
     tags=["Products"],
 )
 
+def product_notification(header: str) -> Callable[[ProductModel], str]:
+    """Текст уведомления о товаре (строится сервисом до коммита)"""
+
+    def build(product: ProductModel) -> str:
+        return f"""{header}
+
+📦 *Название:* {escape_md(product.name)}
+🆔 *ID:* {product.id}
+📝 *Описание:* {escape_md(product.description[:150])}...
+
+💰 *Цены:*
+ • Шмекели: {product.price_shmeckles}
+ • Флурбо: {product.price_flurbos}
+ • Кредиты: {product.price_credits}
+
+🏷 *Категория:* {escape_md(category_registry.get(product.category_id).name)}
+"""
+
+    return build
+
+
 # ==================== GET /products/ ====================
 @router.get(
     "/",
     response_model=List[Product],
     summary="Получить все продукты (из БД)",
+    dependencies=[Depends(catalog_conditional_get)],
 )
 async def get_all_products(
+    response: Response,
     search: Optional[str] = Query(
         None,
-        description="Поиск по названию или описанию",
+        description="Полнотекстовый поиск по названию и описанию",
     ),
     currency: Optional[str] = Query(
         None,
-        description="Валюта для сортировки (shmeckles, flurbos, credits)",
+        description="Валюта для сортировки и фильтра по цене (shmeckles, flurbos, credits)",
     ),
     sort_order: Optional[str] = Query(
         None,
         description="Направление сортировки (asc или desc)",
     ),
-    session: AsyncSession = Depends(get_async_session),
+    limit: int = Query(
+        DEFAULT_PAGE_SIZE,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description="Размер страницы",
+    ),
+    cursor: Optional[str] = Query(
+        None,
+        description="Курсор из заголовка X-Next-Cursor предыдущей страницы",
+    ),
+    category_id: Optional[List[int]] = Query(
+        None,
+        description="Фильтр по категориям (можно передать несколько раз)",
+    ),
+    price_min: Optional[float] = Query(
+        None,
+        ge=0,
+        description="Минимальная цена в валюте currency (по умолчанию шмекели)",
+    ),
+    price_max: Optional[float] = Query(
+        None,
+        ge=0,
+        description="Максимальная цена в валюте currency (по умолчанию шмекели)",
+    ),
+    display_currency: Optional[Currency] = Query(
+        None,
+        description="Валюта, в которой вернуть display_price (по текущему курсу)",
+    ),
+    session: AsyncSession = Depends(get_read_session),
 ):
     try:
-        products = await get_all_products_service(
+        products, next_cursor = await get_all_products_service(
             session=session,
             search=search,
             currency=currency,
             sort_order=sort_order,
+            limit=limit,
+            cursor=cursor,
+            category_ids=category_id,
+            price_min=price_min,
+            price_max=price_max,
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    return products
+    # Курсор следующей страницы отдаём заголовком, тело остаётся списком
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return localize_products(products, display_currency)
+
+
 
 
 
+# ==================== GET /products/facets ====================
+@router.get(
+    "/facets",
+    response_model=ProductFacets,
+    summary="Фасеты каталога: товары по категориям и гистограмма цен",
+    dependencies=[Depends(catalog_conditional_get)],
+)
+async def get_product_facets(
+    currency: Optional[str] = Query(
+        None,
+        description="Валюта фильтра по цене и гистограммы (по умолчанию шмекели)",
+    ),
+    category_id: Optional[List[int]] = Query(
+        None,
+        description="Фильтр по категориям (можно передать несколько раз)",
+    ),
+    price_min: Optional[float] = Query(None, ge=0, description="Минимальная цена"),
+    price_max: Optional[float] = Query(None, ge=0, description="Максимальная цена"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    try:
+        return await get_product_facets_service(
+            session,
+            currency=currency,
+            category_ids=category_id,
+            price_min=price_min,
+            price_max=price_max,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ==================== GET /products/{product_id} ====================
@@ -84,10 +191,11 @@ async def get_all_products(
     "/{product_id}",
     response_model=Product,
     summary="Получить продукт по ID",
+    dependencies=[Depends(catalog_conditional_get)],
 )
 async def get_product(
     product_id: int = Path(..., ge=1, description="ID продукта"),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_read_session),
 ) -> Product:
     product = await get_product_by_id_service(session, product_id)
     if product is None:
@@ -104,33 +212,67 @@ async def get_product(
 )
 async def create_product(
     product_data: ProductCreate,
-    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_async_session),
 ) -> Product:
     try:
-        new_product = await create_product_service(session, product_data)
+        # уведомление в TG пишется в outbox в той же транзакции, запрос его не ждёт
+        new_product = await create_product_service(
+            session, product_data, notify=product_notification("🆕 *Создан новый продукт*")
+        )
     except ValueError as e:
         # сейчас единственный вариант — "Категория не найдена"
         raise HTTPException(status_code=404, detail=str(e))
 
-    # уведомление в TG оставляешь как у тебя было
-    if background_tasks is not None and new_product is not None:
-        message = f"""🆕 *Создан новый продукт*
+    if new_product is not None and new_product.image_url:
+        schedule_image_variants(new_product.id, new_product.image_url)
 
-📦 *Название:* {new_product.name}
-🆔 *ID:* {new_product.id}
-📝 *Описание:* {new_product.description[:150]}...
+    return new_product
 
-💰 *Цены:*
- • Шмекели: {new_product.price_shmeckles}
- • Флурбо: {new_product.price_flurbos}
- • Кредиты: {new_product.price_credits}
 
-🏷 *Категория:* {new_product.category.name}
-"""
-        background_tasks.add_task(send_telegram_message, message)
+# ==================== POST /products/import ====================
+@router.post(
+    "/import",
+    response_model=ProductImportResult,
+    summary="Импорт товаров из CSV или JSONL",
+)
+async def import_products_route(
+    file: UploadFile,
+    format: Optional[str] = Query(
+        None,
+        description="csv или jsonl (по умолчанию — по расширению файла)",
+    ),
+    batch_size: int = Query(
+        settings.import_batch_size,
+        ge=1,
+        le=10000,
+        description="Сколько строк записывать одной пачкой",
+    ),
+    session: AsyncSession = Depends(get_async_session),
+) -> ProductImportResult:
+    fmt = format or detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Не удалось определить формат: укажите format=csv или jsonl",
+        )
 
-    return new_product
+    # Файл читается потоково из временного файла загрузки
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = await import_products(
+            session, stream, fmt, batch_size=batch_size, source=file.filename or ""
+        )
+    except UnicodeDecodeError:
+        # Уже записанные пачки остаются — повторный импорт с id их обновит
+        raise HTTPException(status_code=400, detail="Файл должен быть в кодировке UTF-8")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+
+    if result.created or result.updated:
+        schedule_image_backfill()
+    return result
 
 
 
@@ -143,34 +285,22 @@ async def create_product(
 async def update_product(
     product_id: int = Path(..., ge=1),
     product_data: ProductCreate = Body(..., description="Данные для обновления"),
-    background_tasks: BackgroundTasks = None,
     session: AsyncSession = Depends(get_async_session),
 ) -> Product:
     if product_data is None:
         raise HTTPException(status_code=400, detail="Нет данных для обновления")
 
     try:
-        product = await update_product_service(session, product_id, product_data)
+        product = await update_product_service(
+            session, product_id, product_data, notify=product_notification("🔄 *Обновлён продукт*")
+        )
     except ValueError as e:
         msg = str(e)
         status_code = 404 if "не найден" in msg or "Категория" in msg else 400
         raise HTTPException(status_code=status_code, detail=msg)
 
-    if background_tasks is not None and product is not None:
-        message = f"""🔄 *Обновлён продукт*
-
-📦 *Название:* {product.name}
-🆔 *ID:* {product.id}
-📝 *Описание:* {product.description[:150]}...
-
-💰 *Цены:*
- • Шмекели: {product.price_shmeckles}
- • Флурбо: {product.price_flurbos}
- • Кредиты: {product.price_credits}
-
-🏷 *Категория:* {product.category.name}
-"""
-        background_tasks.add_task(send_telegram_message, message)
+    if product is not None and product.image_url and product.image_variants is None:
+        schedule_image_variants(product.id, product.image_url)
 
     return product
 
@@ -207,47 +337,94 @@ async def upload_product_image(
 ):
     """
     Загружает изображение для товара и привязывает его.
-    Если старое изображение было — оно удаляется.
+    Старое изображение освобождается и удаляется сборщиком мусора,
+    если на него больше никто не ссылается.
     """
     logger.info(f"📥 Запрос на загрузку изображения для товара ID={product_id}")
 
     # 1. Проверяем, что товар существует
-    product = await product_get_by_id(session, product_id)
+    product = await get_product_row(session, product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
-    # 2. Удаляем старое изображение, если есть
-    if product.image_url:
-        logger.info(f"🗑️ Удаление старого изображения: {product.image_url}")
-        delete_product_image(product.image_url)
+    old_image_url = product.image_url
 
-    # 3. Сохраняем новое изображение
+    # 2. Сохраняем новое изображение (одинаковые файлы хранятся один раз)
     try:
-        image_url = await save_product_image(file)
+        image_url = await save_product_image(session, file)
     except HTTPException:
         # save_product_image уже залогировал и вернул корректный статус
         raise
 
-    # 4. Обновляем БД
+    # 3. Обновляем БД и счётчики ссылок одной транзакцией
     try:
         stmt = (
             update(ProductModel)
             .where(ProductModel.id == product_id)
-            .values(image_url=image_url)
+            .values(image_url=image_url, image_variants=None)
         )
         await session.execute(stmt)
+        if image_url != old_image_url:
+            await retain_image(session, image_url)
+            await release_image(session, old_image_url)
         await session.commit()
+        # image_url не влияет на порядок выдачи — сбрасываем только записи с этим товаром
+        invalidate_product_cache(product_id, lists=False)
     except Exception as e:
         logger.exception(f"🔥 Ошибка обновления image_url в БД: {e}")
+        await session.rollback()
         raise HTTPException(
             status_code=500,
             detail="Не удалось обновить изображение товара",
         )
 
+    # 4. Миниатюры и WebP/AVIF строятся в пуле процессов, ответ их не ждёт
+    schedule_image_variants(product_id, image_url)
+
     logger.info(f"✅ Изображение товара {product_id} обновлено: {image_url}")
     return {"product_id": product_id, "image_url": image_url}
 
 
+# ==================== GET /products/{product_id}/image ====================
+@router.get(
+    "/{product_id}/image",
+    summary="Изображение товара в подходящем размере и формате",
+    response_class=RedirectResponse,
+    status_code=307,
+)
+async def get_product_image(
+    request: Request,
+    product_id: int = Path(..., ge=1, description="ID продукта"),
+    w: Optional[int] = Query(
+        None,
+        ge=1,
+        le=4096,
+        description="Желаемая ширина, px",
+    ),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Перенаправляет на лучший вариант изображения: AVIF/WebP, если их
+    принимает клиент (заголовок Accept), и самую узкую копию не уже w.
+    Пока варианты не готовы — на исходное изображение.
+    """
+    product = await get_product_by_id_service(session, product_id)
+    if product is None or not product.image_url:
+        raise HTTPException(status_code=404, detail="Изображение не найдено")
+
+    url = select_image_variant(
+        product.image_variants,
+        request.headers.get("accept"),
+        w,
+    ) or product.image_url
+
+    return RedirectResponse(
+        asset_url(url),
+        status_code=307,
+        headers={"Vary": "Accept", "Cache-Control": "public, max-age=60"},
+    )
+
+
 # ==================== DELETE /products/{product_id}/image ====================
 @router.delete(
     "/{product_id}/image",
@@ -258,33 +435,29 @@ async def delete_product_image_endpoint(
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Удаляет изображение товара (с диска и из БД).
+    Отвязывает изображение от товара. Файл удаляет сборщик мусора,
+    когда на него не останется ссылок.
     """
     logger.info(f"🗑️ Запрос на удаление изображения товара ID={product_id}")
 
-    product = await product_get_by_id(session, product_id)
+    product = await get_product_row(session, product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
     if not product.image_url:
         raise HTTPException(status_code=400, detail="У товара нет изображения")
 
-    # Удаляем файл с диска
-    deleted = delete_product_image(product.image_url)
-    if not deleted:
-        logger.warning(
-            f"⚠️ Файл для товара {product_id} не найден на диске: {product.image_url}"
-        )
-
-    # Обнуляем image_url в БД
+    # Обнуляем image_url в БД и снимаем ссылку на файл
     try:
         stmt = (
             update(ProductModel)
             .where(ProductModel.id == product_id)
-            .values(image_url=None)
+            .values(image_url=None, image_variants=None)
         )
         await session.execute(stmt)
+        await release_image(session, product.image_url)
         await session.commit()
+        invalidate_product_cache(product_id, lists=False)
     except Exception as e:
         logger.exception(f"🔥 Ошибка очистки image_url в БД: {e}")
         raise HTTPException(
@@ -1,5 +1,5 @@
-from .product import Product
+from .product import Product, ProductFacets, ProductImportResult
 from .product_create import ProductCreate
 from .user import UserRead, UserCreate, UserUpdate
 
-__all__ = ["Product", "ProductCreate"]
+__all__ = ["Product", "ProductFacets", "ProductImportResult", "ProductCreate"]
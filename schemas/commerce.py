@@ -1,6 +1,9 @@
 from datetime import datetime
-from typing import List
-from pydantic import BaseModel, ConfigDict, Field, computed_field
+from typing import List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_serializer
+
+from core.currencies import Currency
+from core.static import asset_url
 
 
 class CartItemCreate(BaseModel):
@@ -15,6 +18,11 @@ class ProductInCart(BaseModel):
     price_flurbos: float
     image_url: str | None = None
     quantity: int  # остаток на складе!
+    display_price: float | None = None  # цена в валюте отображения
+
+    @field_serializer("image_url")
+    def serialize_image_url(self, image_url: str | None) -> str | None:
+        return asset_url(image_url)
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -32,6 +40,8 @@ class CartRead(BaseModel):
     id: int
     user_id: int
     items: List[CartItemRead]
+    display_currency: Currency | None = None
+    display_total: float | None = None  # total_price в валюте отображения
 
     @computed_field
     @property
@@ -45,6 +55,33 @@ class CartRead(BaseModel):
 
 
 
+class CartBatchOperation(BaseModel):
+    """
+    Операция пакетного изменения корзины:
+    add — добавить quantity, set — установить quantity (0 = удалить), remove — удалить.
+    """
+    op: Literal["add", "set", "remove"]
+    product_id: int = Field(gt=0)
+    quantity: Optional[int] = Field(default=None, ge=0)
+
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartBatchOperation] = Field(min_length=1, max_length=500)
+    # True — применить корректные операции и вернуть ошибки остальных
+    continue_on_error: bool = False
+
+
+class CartBatchError(BaseModel):
+    index: int
+    product_id: int
+    detail: str
+
+
+class CartBatchResult(BaseModel):
+    cart: CartRead
+    errors: List[CartBatchError] = []
+
+
 class OrderCreate(BaseModel):
     delivery_address: str = Field(min_length=10, max_length=500)
     phone: str = Field(min_length=10, max_length=20)
@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+
+
+class ExchangeRateCreate(BaseModel):
+    """
+    Новые курсы: сколько единиц валюты дают за 1 шмекель.
+    """
+    rate_flurbos: float = Field(
+        ...,
+        gt=0,
+        description="Флурбо за 1 шмекель",
+        example=0.65,
+    )
+    rate_credits: float = Field(
+        ...,
+        gt=0,
+        description="Кредитов за 1 шмекель",
+        example=0.74,
+    )
+
+
+class ExchangeRateRead(BaseModel):
+    """
+    Версия курсов и прогресс переоценки каталога по ней.
+    """
+    id: int
+    rate_flurbos: float
+    rate_credits: float
+    status: str
+    total_products: int
+    repriced_products: int
+    created_at: datetime
+    applied_at: Optional[datetime] = None
+
+    @computed_field
+    @property
+    def progress(self) -> float:
+        """Доля пересчитанных товаров, 0..1"""
+        if self.status == "applied" or self.total_products == 0:
+            return 1.0 if self.status == "applied" else 0.0
+        return round(min(self.repriced_products / self.total_products, 1.0), 4)
+
+    model_config = ConfigDict(from_attributes=True)
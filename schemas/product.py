@@ -1,6 +1,10 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field, computed_field, ConfigDict
+from pydantic import BaseModel, Field, computed_field, ConfigDict, field_serializer, model_validator
+
+from core.category_registry import category_registry
+from core.currencies import Currency
+from core.static import asset_url
 
 from schemas.category import CategoryRead
 
@@ -21,6 +25,11 @@ class Product(BaseModel):
         description="Путь к изображению товара",
         example="/uploads/products/plumbus.webp",
     )
+    image_variants: Optional[Dict[str, Dict[str, str]]] = Field(
+        None,
+        description="Уменьшенные копии изображения: {формат: {ширина: путь}}",
+        example={"webp": {"320": "/uploads/variants/plumbus-320.webp"}},
+    )
     price_shmeckles: float = Field(
         ...,
         description="Цена в шмекелях",
@@ -37,6 +46,36 @@ class Product(BaseModel):
         example=4.8,
     )
     category: CategoryRead
+    display_currency: Optional[Currency] = Field(
+        None,
+        description="Валюта отображения (параметр display_currency запроса)",
+    )
+    display_price: Optional[float] = Field(
+        None,
+        description="Цена в валюте отображения по текущему курсу",
+        example=4.23,
+    )
+
+    # Категория ORM-товара берётся из реестра по category_id:
+    # связь Product.category не загружается (лишний SELECT на каждый запрос).
+    # Вызывающий код сначала делает category_registry.ensure; промах после
+    # этого — ошибка вызывающего кода, а не данных запроса, поэтому
+    # LookupError (pydantic не превращает его в ValidationError)
+    @model_validator(mode="before")
+    @classmethod
+    def category_from_registry(cls, data: Any) -> Any:
+        if isinstance(data, dict) or not hasattr(data, "category_id"):
+            return data
+        values = {
+            name: getattr(data, name)
+            for name in cls.model_fields
+            if name != "category" and hasattr(data, name)
+        }
+        category = category_registry.get(data.category_id)
+        if category is None:
+            raise LookupError(f"Категория {data.category_id} не загружена в реестр")
+        values["category"] = category
+        return values
 
     # Вычисляемое поле для фронтенда - использует price_shmeckles как основную цену
     @computed_field
@@ -45,4 +84,59 @@ class Product(BaseModel):
         """Основная цена товара (в шмекелях)"""
         return self.price_shmeckles
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    # В ответе пути к картинкам заменяются URL с отпечатком содержимого
+    @field_serializer("image_url")
+    def serialize_image_url(self, image_url: Optional[str]) -> Optional[str]:
+        return asset_url(image_url)
+
+    @field_serializer("image_variants")
+    def serialize_image_variants(
+        self, image_variants: Optional[Dict[str, Dict[str, str]]]
+    ) -> Optional[Dict[str, Dict[str, str]]]:
+        if not image_variants:
+            return image_variants
+        return {
+            fmt: {width: asset_url(url) for width, url in by_width.items()}
+            for fmt, by_width in image_variants.items()
+        }
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CategoryFacet(BaseModel):
+    category_id: int
+    count: int
+
+
+class PriceBucket(BaseModel):
+    min: float
+    max: float
+    count: int
+
+
+class ProductFacets(BaseModel):
+    """
+    Фасеты каталога. Счётчики категорий не учитывают фильтр по категориям,
+    гистограмма цен — фильтр по цене (чтобы было видно, что можно выбрать ещё).
+    """
+    total: int = Field(..., description="Товаров под всеми фильтрами")
+    currency: str = Field(..., description="Валюта фильтра и гистограммы цен")
+    categories: List[CategoryFacet]
+    price_histogram: List[PriceBucket]
+
+
+class ProductImportError(BaseModel):
+    line: int = Field(..., description="Номер строки файла (для CSV — с учётом заголовка)")
+    errors: List[str]
+
+
+class ProductImportResult(BaseModel):
+    """Итог импорта товаров из файла"""
+    total: int = Field(..., description="Прочитано строк с данными")
+    created: int
+    updated: int = Field(..., description="Обновлено товаров (строки с id)")
+    failed: int
+    errors: List[ProductImportError] = Field(
+        ..., description="Ошибки по строкам (не больше IMPORT_MAX_ERRORS)"
+    )
+    elapsed_ms: float
@@ -56,3 +56,16 @@ class ProductCreate(BaseModel):
         description="ID категории, к которой относится товар",
         example=1,
     )
+
+
+class ProductImportRow(ProductCreate):
+    """
+    Строка массового импорта. С id — обновление (или вставка с этим id),
+    без id — новый товар.
+    """
+
+    id: Optional[int] = Field(
+        None,
+        ge=1,
+        description="ID товара для upsert",
+    )
@@ -0,0 +1,74 @@
+"""
+Массовый импорт товаров из CSV или JSONL в основную БД (DATABASE_URL).
+
+    python scripts/import_products.py products.csv
+    python scripts/import_products.py dump.jsonl --batch-size 5000
+
+Колонки — поля ProductCreate (category_id или category с именем категории),
+строки с id обновляют существующие товары. Сводное уведомление уходит
+в Telegram через outbox (его отправит запущенное приложение).
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+import os
+
+# Путь к файлу считаем от каталога запуска, до смены рабочего каталога
+invoked_from = os.getcwd()
+
+# Добавляем корень backend в path
+backend_path = str(Path(__file__).parent.parent)
+sys.path.insert(0, backend_path)
+os.chdir(backend_path)
+
+from core.config import settings
+from core.database import AsyncSessionLocal, engine
+from services.import_service import detect_format, import_products
+
+
+async def run(path: Path, fmt: str, batch_size: int) -> None:
+    engine.echo = False  # SQL каждой пачки в лог не нужен
+    async with AsyncSessionLocal() as session:
+        with path.open(encoding="utf-8-sig", newline="") as stream:
+            result = await import_products(
+                session, stream, fmt, batch_size=batch_size, source=path.name
+            )
+    await engine.dispose()
+
+    print(
+        f"✅ Импорт завершён за {result.elapsed_ms / 1000:.1f} с: "
+        f"строк {result.total}, создано {result.created}, "
+        f"обновлено {result.updated}, с ошибками {result.failed}"
+    )
+    for error in result.errors:
+        print(f"  ❌ строка {error.line}: {'; '.join(error.errors)}")
+    if result.failed > len(result.errors):
+        print(f"  … и ещё {result.failed - len(result.errors)} строк с ошибками")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Импортирует товары из CSV или JSONL")
+    parser.add_argument("file", help="Путь к файлу .csv или .jsonl")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Формат (по умолчанию — по расширению)")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.import_batch_size,
+        help="Сколько строк записывать одной пачкой",
+    )
+    args = parser.parse_args()
+
+    path = Path(invoked_from, args.file)
+    fmt = args.format or detect_format(path.name)
+    if fmt is None:
+        sys.exit("❌ Не удалось определить формат: укажите --format csv или jsonl")
+    if not path.is_file():
+        sys.exit(f"❌ Файл не найден: {path}")
+
+    asyncio.run(run(path, fmt, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ os.chdir(backend_path)
 from core.database import Base
 from models.category import Category
 from models.product import Product
+from services.search_service import get_search_backend, init_search_index
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -222,6 +223,7 @@ async def seed_database():
     async with engine.begin() as conn:
         print("📝 Создаю таблицы...")
         await conn.run_sync(Base.metadata.create_all)
+        await init_search_index(conn)
     print("✅ Таблицы созданы")
 
     async_session = sessionmaker(
@@ -252,6 +254,8 @@ async def seed_database():
             for prod_data in PRODUCTS:
                 product = Product(**prod_data)
                 session.add(product)
+            await session.flush()
+            await get_search_backend(session).rebuild(session)
             await session.commit()
             print(f"✅ Товары созданы ({len(PRODUCTS)} штук)")
         else:
@@ -0,0 +1,57 @@
+"""
+Локальная «реплика» для проверки разделения чтения и записи на SQLite.
+
+Копирует основную БД (DATABASE_URL) в файл реплики через online backup API
+SQLite. Запуск в цикле имитирует отставание реплики:
+
+    DATABASE_REPLICA_URLS=sqlite+aiosqlite:///./replica.db
+    python scripts/sync_sqlite_replica.py ./replica.db --interval 2
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+import os
+
+# Добавляем корень backend в path
+backend_path = str(Path(__file__).parent.parent)
+sys.path.insert(0, backend_path)
+os.chdir(backend_path)
+
+from sqlalchemy.engine import make_url
+
+from core.config import settings
+
+
+def sync(primary_path: str, replica_path: str) -> None:
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Копирует основную SQLite БД в реплику")
+    parser.add_argument("replica", help="Путь к файлу реплики")
+    parser.add_argument("--interval", type=float, default=0, help="Повторять каждые N секунд")
+    args = parser.parse_args()
+
+    url = make_url(settings.database_url)
+    if url.get_backend_name() != "sqlite" or not url.database:
+        sys.exit("❌ DATABASE_URL должен указывать на файл SQLite")
+
+    while True:
+        sync(url.database, args.replica)
+        print(f"✅ Реплика обновлена: {args.replica}")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
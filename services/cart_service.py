@@ -1,13 +1,28 @@
 # services/cart_service.py
-from typing import List
+from typing import Dict, List, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import delete, func, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
 
+from core.database import upsert_insert
 from models.commerce import Cart, CartItem
 from models.product import Product
-from schemas.commerce import CartItemCreate
+from models.inventory import StockReservation
+from schemas.commerce import CartItemCreate, CartBatchRequest, CartBatchError, CartRead
+from services.inventory_service import (
+    free_quantity,
+    get_available_quantity,
+    get_free_quantities,
+    held_by_others,
+    hold_expires_at,
+    hold_stock_many,
+    hold_upsert,
+    lock_products,
+    release_stock,
+    reserve_stock,
+    utcnow,
+)
 
 
 async def get_or_create_cart_service(
@@ -27,43 +42,186 @@ async def get_or_create_cart_service(
     return cart
 
 
+async def load_cart(session: AsyncSession, cart_id: int) -> Cart:
+    """Корзина со строками и товарами одним запросом (JOIN)"""
+    result = await session.execute(
+        select(Cart)
+        .where(Cart.id == cart_id)
+        .options(joinedload(Cart.items).joinedload(CartItem.product))
+        .execution_options(populate_existing=True)
+    )
+    return result.unique().scalar_one()
+
+
+async def upsert_cart_id(session: AsyncSession, user_id: int) -> int:
+    """id корзины пользователя; создаёт её при необходимости одним upsert'ом"""
+    stmt = upsert_insert(session, Cart).values(user_id=user_id)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id],
+        set_={"updated_at": func.now()},
+    ).returning(Cart.id)
+    return (await session.execute(stmt)).scalar_one()
+
+
 async def add_item_to_cart_service(
     user_id: int,
     payload: CartItemCreate,
     session: AsyncSession,
 ) -> Cart:
-    cart = await get_or_create_cart_service(user_id, session)
+    """
+    Добавление в корзину: upsert корзины, блокировка строки товара и один
+    запрос — INSERT ... ON CONFLICT DO UPDATE строки с проверкой остатка
+    внутри и записью холда (в Postgres — через CTE), затем сразу коммит.
+    Строка товара заблокирована только на этот запрос; корзина читается
+    уже после коммита.
+    """
+    cart_id = await upsert_cart_id(session, user_id)
+    now = utcnow()
 
-    product = await session.get(Product, payload.product_id)
-    if product is None:
-        raise ValueError("Товар не найден")
+    # Новая строка вставится, только если товар есть и остатка хватает;
+    # существующая — увеличится, только если хватает на итоговое количество.
+    stmt = upsert_insert(session, CartItem).from_select(
+        ["cart_id", "product_id", "quantity"],
+        select(literal(cart_id), Product.id, literal(payload.quantity)).where(
+            Product.id == payload.product_id,
+            Product.quantity - held_by_others(Product.id, cart_id, now) >= payload.quantity,
+        ),
+    )
+    new_quantity = CartItem.quantity + stmt.excluded.quantity
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.cart_id, CartItem.product_id],
+        set_={"quantity": new_quantity},
+        where=free_quantity(payload.product_id, cart_id, now) >= new_quantity,
+    ).returning(CartItem.quantity)
+
+    # Без блокировки две корзины одновременно увидят последнюю единицу свободной
+    await lock_products(session, [payload.product_id])
+    if session.get_bind().dialect.name == "postgresql":
+        line = stmt.cte("line")
+        hold = hold_upsert(
+            session,
+            select(
+                literal(payload.product_id),
+                literal(cart_id),
+                line.c.quantity,
+                literal(hold_expires_at(now), StockReservation.expires_at.type),
+            ),
+        ).returning(StockReservation.quantity)
+        quantity = (await session.execute(hold)).scalar_one_or_none()
+    else:
+        # SQLite не умеет INSERT внутри WITH; пишущая транзакция там и так одна на БД
+        quantity = (await session.execute(stmt)).scalar_one_or_none()
+        if quantity is not None:
+            await reserve_stock(session, cart_id, payload.product_id, quantity, check=False)
 
-    if product.quantity < payload.quantity:
-        raise ValueError(f"Недостаточно товара на складе. Доступно: {product.quantity} шт.")
+    if quantity is None:
+        await session.rollback()
+        available = await get_available_quantity(session, payload.product_id, cart_id)
+        if available is None:
+            raise ValueError("Товар не найден")
+        raise ValueError(f"Недостаточно товара на складе. Доступно: {available} шт.")
+
+    await session.commit()
+    return await load_cart(session, cart_id)
+
+
+async def apply_cart_batch_service(
+    user_id: int,
+    payload: CartBatchRequest,
+    session: AsyncSession,
+) -> Tuple[Cart, List[CartBatchError]]:
+    """
+    Пакетное изменение корзины в одной транзакции.
+
+    Операции сворачиваются в итоговое количество по каждому товару,
+    остатки проверяются одним запросом, затем изменения пишутся
+    set-based: один DELETE удалённых строк, один многострочный upsert
+    строк и один upsert холдов.
+    """
+    cart_id = await upsert_cart_id(session, user_id)
 
     result = await session.execute(
-        select(CartItem)
-        .where(CartItem.cart_id == cart.id, CartItem.product_id == product.id)
-        .options(selectinload(CartItem.product))
+        select(CartItem.product_id, CartItem.quantity).where(CartItem.cart_id == cart_id)
     )
-    cart_item = result.scalar_one_or_none()
+    current: Dict[int, int] = dict(result.all())
 
-    if cart_item:
-        new_qty = cart_item.quantity + payload.quantity
-        if new_qty > product.quantity:
-            raise ValueError(f"Нельзя добавить столько товара. Доступно: {product.quantity} шт.")
-        cart_item.quantity = new_qty
-    else:
-        cart_item = CartItem(
-            cart_id=cart.id,
-            product_id=product.id,
-            quantity=payload.quantity,
+    target: Dict[int, int] = {}
+    last_index: Dict[int, int] = {}
+    errors: List[CartBatchError] = []
+    for index, operation in enumerate(payload.operations):
+        product_id = operation.product_id
+        quantity = target.get(product_id, current.get(product_id, 0))
+        if operation.op == "remove":
+            quantity = 0
+        elif operation.quantity is None:
+            errors.append(CartBatchError(
+                index=index, product_id=product_id, detail="Не указано количество",
+            ))
+            continue
+        elif operation.op == "add":
+            quantity += operation.quantity
+        else:
+            quantity = operation.quantity
+        target[product_id] = quantity
+        last_index[product_id] = index
+
+    wanted = [pid for pid, qty in target.items() if qty > 0]
+    # Строки товаров блокируются до коммита: между проверкой и записью
+    # холдов другая корзина не займёт тот же остаток
+    free = await get_free_quantities(session, wanted, cart_id, lock=True) if wanted else {}
+    for product_id in wanted:
+        available = free.get(product_id)
+        if available is None:
+            detail = "Товар не найден"
+        elif target[product_id] > available:
+            detail = f"Недостаточно товара на складе. Доступно: {available} шт."
+        else:
+            continue
+        errors.append(CartBatchError(
+            index=last_index[product_id], product_id=product_id, detail=detail,
+        ))
+        # Строка с ошибкой остаётся как была
+        del target[product_id]
+
+    if errors and not payload.continue_on_error:
+        raise ValueError("; ".join(
+            f"#{error.index} (товар {error.product_id}): {error.detail}"
+            for error in sorted(errors, key=lambda e: e.index)
+        ))
+
+    removed = [pid for pid, qty in target.items() if qty == 0 and pid in current]
+    changed = {
+        pid: qty for pid, qty in target.items()
+        if qty > 0 and qty != current.get(pid)
+    }
+
+    if removed:
+        await session.execute(
+            delete(CartItem).where(
+                CartItem.cart_id == cart_id,
+                CartItem.product_id.in_(removed),
+            )
         )
-        session.add(cart_item)
+        await release_stock(session, cart_id, removed)
 
+    if changed:
+        stmt = upsert_insert(session, CartItem).values(
+            [
+                {"cart_id": cart_id, "product_id": pid, "quantity": qty}
+                for pid, qty in changed.items()
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={"quantity": stmt.excluded.quantity},
+        )
+        await session.execute(stmt)
+        await hold_stock_many(session, cart_id, changed)
+
+    # Корзину читаем после коммита — блокировки строк товаров уже сняты
     await session.commit()
-    await session.refresh(cart)
-    return cart
+    cart = await load_cart(session, cart_id)
+    return cart, sorted(errors, key=lambda e: e.index)
 
 
 async def delete_cart_item_service(
@@ -71,31 +229,63 @@ async def delete_cart_item_service(
     item_id: int,
     session: AsyncSession,
 ) -> Cart:
-    cart = await get_or_create_cart_service(user_id, session)
+    cart_id = await upsert_cart_id(session, user_id)
 
     result = await session.execute(
-        select(CartItem)
-        .where(CartItem.id == item_id, CartItem.cart_id == cart.id)
+        delete(CartItem)
+        .where(CartItem.id == item_id, CartItem.cart_id == cart_id)
+        .returning(CartItem.product_id)
     )
-    cart_item = result.scalar_one_or_none()
-    if cart_item is None:
+    product_id = result.scalar_one_or_none()
+    if product_id is None:
         raise ValueError("Позиция не найдена")
 
-    await session.delete(cart_item)
+    await release_stock(session, cart_id, [product_id])
+    cart = await load_cart(session, cart_id)
     await session.commit()
-    await session.refresh(cart)
     return cart
 
 
 async def clear_cart_service(
     user_id: int,
     session: AsyncSession,
-) -> Cart:
-    cart = await get_or_create_cart_service(user_id, session)
+) -> CartRead:
+    """
+    Очищает корзину одним DELETE строк (и одним DELETE холдов)
+    и сразу отдаёт пустую корзину, не перечитывая её из БД.
+    """
+    cart_id = await upsert_cart_id(session, user_id)
+    await session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+    await release_stock(session, cart_id)
+    await session.commit()
+    return CartRead(id=cart_id, user_id=user_id, items=[])
 
-    for item in list(cart.items):
-        await session.delete(item)
 
-    await session.commit()
-    await session.refresh(cart)
-    return cart
+async def delete_user_carts_service(
+    user_id: int,
+    session: AsyncSession,
+) -> None:
+    """
+    Удаляет корзины пользователя set-based, без загрузки строк в ORM:
+    холды, строки и сами корзины — по одному DELETE. Без коммита.
+    """
+    cart_ids = select(Cart.id).where(Cart.user_id == user_id)
+    await session.execute(
+        delete(StockReservation).where(StockReservation.cart_id.in_(cart_ids))
+    )
+    await session.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids)))
+    await session.execute(delete(Cart).where(Cart.user_id == user_id))
+
+
+async def delete_product_cart_lines_service(
+    product_ids,
+    session: AsyncSession,
+) -> None:
+    """
+    Убирает удаляемые товары из всех корзин: один DELETE строк и один
+    DELETE холдов. product_ids — список id или подзапрос. Без коммита.
+    """
+    await session.execute(
+        delete(StockReservation).where(StockReservation.product_id.in_(product_ids))
+    )
+    await session.execute(delete(CartItem).where(CartItem.product_id.in_(product_ids)))
@@ -0,0 +1,62 @@
+# services/currency_service.py
+"""
+Цены в валюте отображения (параметр display_currency).
+
+Конвертация идёт пакетом по всей странице товаров / корзине
+(core.currencies.convert_prices), а не вызовом convert_price на каждую цену.
+Закэшированные схемы не меняются — возвращаются их копии.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from core.currencies import Currency, convert_prices, round_prices
+from models.commerce import Cart
+from schemas import Product as ProductSchema
+from schemas.commerce import CartRead
+
+
+def localize_products(
+    products: List[ProductSchema],
+    currency: Optional[Currency],
+) -> List[ProductSchema]:
+    """Заполняет display_price у страницы товаров"""
+    if currency is None or not products:
+        return products
+
+    prices = np.fromiter(
+        (p.price_shmeckles for p in products), dtype=np.float64, count=len(products)
+    )
+    converted = convert_prices(prices, currency).tolist()
+    return [
+        product.model_copy(update={"display_currency": currency, "display_price": price})
+        for product, price in zip(products, converted)
+    ]
+
+
+def localize_cart(cart: Cart, currency: Optional[Currency]) -> CartRead:
+    """Корзина с ценами позиций и итогом в валюте отображения"""
+    cart_read = CartRead.model_validate(cart)
+    if currency is None:
+        return cart_read
+
+    items = cart_read.items
+    prices = np.fromiter(
+        (item.product.price_shmeckles for item in items), dtype=np.float64, count=len(items)
+    )
+    quantities = np.fromiter(
+        (item.quantity for item in items), dtype=np.float64, count=len(items)
+    )
+    converted = convert_prices(prices, currency)
+    total = float(round_prices(np.dot(converted, quantities)))
+
+    items = [
+        item.model_copy(
+            update={"product": item.product.model_copy(update={"display_price": price})}
+        )
+        for item, price in zip(items, converted.tolist())
+    ]
+    return cart_read.model_copy(
+        update={"items": items, "display_currency": currency, "display_total": total}
+    )
@@ -0,0 +1,250 @@
+# services/exchange_rate_service.py
+"""
+Версионные курсы валют и переоценка каталога.
+
+Курсы хранятся в БД (exchange_rates), процесс держит актуальную применённую
+версию в памяти (core.currencies.CONVERSION_RATES) и периодически её перечитывает.
+
+Новая версия запускает переоценку: price_flurbos и price_credits всего
+каталога пересчитываются из price_shmeckles пачками по id — каждый пакет
+отдельный UPDATE в своей короткой транзакции, так что блокируются только
+строки текущего пакета. После каждого пакета сохраняется чекпойнт и прогресс,
+поэтому прерванная переоценка продолжается с того же места.
+
+Версию переоценивает один воркер: он захватывает её атомарным UPDATE
+(pending -> repricing) и отмечает heartbeat_at после каждого пакета.
+Переоценку, которая давно не двигалась (воркер упал), может захватить другой.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import Numeric, cast, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import catalog_cache
+from core.catalog_version import catalog_version
+from core.config import settings
+from core.currencies import Currency, set_conversion_rates
+from core.database import AsyncSessionLocal
+from models.exchange_rate import ExchangeRate
+from services.facet_service import facet_index
+from models.product import Product as ProductModel
+from schemas.exchange_rate import ExchangeRateCreate
+
+logger = logging.getLogger(__name__)
+
+# Запущенные переоценки (держим ссылки, чтобы задачи не собрал GC)
+_tasks: Set[asyncio.Task] = set()
+
+# Применённая версия курсов, которую использует этот процесс
+current_rate_id: Optional[int] = None
+
+
+def rates_of(rate: ExchangeRate) -> Dict[Currency, float]:
+    return {
+        Currency.FLURBOS: rate.rate_flurbos,
+        Currency.CREDITS: rate.rate_credits,
+    }
+
+
+async def refresh_exchange_rates(session: AsyncSession) -> Optional[int]:
+    """
+    Подгружает последнюю применённую версию курсов в память процесса.
+    При смене версии сбрасывает кэш каталога и перестраивает индекс фасетов:
+    в них цены по старым курсам.
+    """
+    global current_rate_id
+    rate = await session.scalar(
+        select(ExchangeRate)
+        .where(ExchangeRate.status == "applied")
+        .order_by(ExchangeRate.id.desc())
+        .limit(1)
+    )
+    if rate is not None and rate.id != current_rate_id:
+        set_conversion_rates(rates_of(rate))
+        current_rate_id = rate.id
+        catalog_cache.clear()
+        catalog_version.bump()
+        if facet_index.ready:
+            await facet_index.rebuild(session)
+        logger.info(f"💱 Курсы валют: версия {rate.id}")
+    return current_rate_id
+
+
+async def get_exchange_rates_service(session: AsyncSession) -> List[ExchangeRate]:
+    """Все версии курсов, новые первыми"""
+    result = await session.execute(select(ExchangeRate).order_by(ExchangeRate.id.desc()))
+    return list(result.scalars().all())
+
+
+async def get_exchange_rate_service(session: AsyncSession, rate_id: int) -> ExchangeRate:
+    rate = await session.get(ExchangeRate, rate_id)
+    if rate is None:
+        raise ValueError("Версия курсов не найдена")
+    return rate
+
+
+async def create_exchange_rate_service(
+    session: AsyncSession,
+    data: ExchangeRateCreate,
+) -> ExchangeRate:
+    """
+    Создаёт новую версию курсов (status=pending). Переоценку запускает
+    schedule_repricing — после коммита, чтобы задача увидела строку.
+    """
+    rate = ExchangeRate(
+        rate_flurbos=data.rate_flurbos,
+        rate_credits=data.rate_credits,
+        status="pending",
+        total_products=await session.scalar(select(func.count(ProductModel.id))),
+    )
+    session.add(rate)
+    await session.flush()
+    return rate
+
+
+def _price_expr(rate: float):
+    # round() у Postgres есть только для numeric, поэтому явно приводим тип
+    return func.round(cast(ProductModel.price_shmeckles * rate, Numeric(14, 4)), 2)
+
+
+async def claim_repricing(
+    session: AsyncSession,
+    rate_id: int,
+    stale_after: float = settings.reprice_stale_after,
+) -> bool:
+    """
+    Атомарно захватывает переоценку версии rate_id: новую (pending) или
+    брошенную (repricing без прогресса дольше stale_after). False — её ведёт
+    другой воркер или она уже завершена.
+    """
+    now = datetime.now(timezone.utc)
+    result = await session.execute(
+        update(ExchangeRate)
+        .where(
+            ExchangeRate.id == rate_id,
+            or_(
+                ExchangeRate.status == "pending",
+                (ExchangeRate.status == "repricing") & or_(
+                    ExchangeRate.heartbeat_at.is_(None),
+                    ExchangeRate.heartbeat_at < now - timedelta(seconds=stale_after),
+                ),
+            ),
+        )
+        .values(status="repricing", heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount == 1
+
+
+async def reprice_catalog(
+    rate_id: int,
+    batch_size: int = settings.reprice_batch,
+) -> Optional[ExchangeRate]:
+    """
+    Пересчитывает цены каталога по версии курсов rate_id.
+    Останавливается (status=superseded), если появилась версия новее.
+    """
+    async with AsyncSessionLocal() as session:
+        claimed = await claim_repricing(session, rate_id)
+        rate = await session.get(ExchangeRate, rate_id)
+        if not claimed:
+            return rate
+        values = {
+            ProductModel.price_flurbos: _price_expr(rate.rate_flurbos),
+            ProductModel.price_credits: _price_expr(rate.rate_credits),
+        }
+
+        while True:
+            latest = await session.scalar(select(func.max(ExchangeRate.id)))
+            if latest != rate_id:
+                rate.status = "superseded"
+                await session.commit()
+                logger.info(f"💱 Переоценка по курсам v{rate_id} прервана: есть версия v{latest}")
+                return rate
+
+            # Верхняя граница пакета: id batch_size-го следующего товара
+            upper = await session.scalar(
+                select(ProductModel.id)
+                .where(ProductModel.id > rate.last_product_id)
+                .order_by(ProductModel.id)
+                .offset(batch_size - 1)
+                .limit(1)
+            )
+            batch = ProductModel.id > rate.last_product_id
+            if upper is not None:
+                batch = batch & (ProductModel.id <= upper)
+
+            result = await session.execute(
+                update(ProductModel)
+                .where(batch)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+            rate.repriced_products += result.rowcount
+            if upper is None:
+                break
+            rate.last_product_id = upper
+            rate.heartbeat_at = datetime.now(timezone.utc)
+            await session.commit()
+            logger.info(
+                f"💱 Переоценка v{rate_id}: {rate.repriced_products}/{rate.total_products}"
+            )
+            # Отдаём event loop запросам между пакетами
+            await asyncio.sleep(0)
+
+        rate.status = "applied"
+        rate.total_products = rate.repriced_products
+        rate.applied_at = datetime.now(timezone.utc)
+        await session.commit()
+
+        await refresh_exchange_rates(session)
+        logger.info(f"✅ Каталог переоценён по курсам v{rate_id}: {rate.repriced_products} товаров")
+        return rate
+
+
+def schedule_repricing(rate_id: int) -> None:
+    """Запускает переоценку в фоне, не дожидаясь результата"""
+
+    async def run() -> None:
+        try:
+            await reprice_catalog(rate_id)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка переоценки по курсам v{rate_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def exchange_rate_refresher(
+    interval: float = settings.exchange_rate_refresh_interval,
+) -> None:
+    """
+    Фоновая задача: при старте продолжает незавершённую переоценку,
+    затем периодически перечитывает курсы (их могли сменить другие воркеры).
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            unfinished = await session.scalar(
+                select(ExchangeRate.id)
+                .where(ExchangeRate.status.in_(("pending", "repricing")))
+                .order_by(ExchangeRate.id.desc())
+                .limit(1)
+            )
+        if unfinished is not None:
+            schedule_repricing(unfinished)
+    except Exception as e:
+        logger.exception(f"❌ Ошибка возобновления переоценки: {e}")
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await refresh_exchange_rates(session)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка обновления курсов валют: {e}")
+        await asyncio.sleep(interval)
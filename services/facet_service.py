@@ -0,0 +1,387 @@
+# services/facet_service.py
+"""
+In-memory bitmap-индекс товаров для фильтров и фасетов каталога.
+
+Позиция в массивах = id товара. Для каждой категории хранится битовая
+маска, упакованная по 8 товаров в байт (формат np.packbits), длиной до
+наибольшего id своей категории; цены — плотными массивами по валютам.
+Фильтр «категории ∪ диапазон цены» — это OR масок категорий и AND
+со сравнением цен, фасеты — подсчёт битов под маской. Всё векторно,
+без запросов к БД.
+
+Индекс строится одним SELECT при старте, затем обновляется точечно
+при записи товаров (upsert/remove) и периодически перестраивается целиком —
+чтобы подхватить изменения других воркеров.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.product import Product as ProductModel
+
+logger = logging.getLogger(__name__)
+
+PRICE_CURRENCIES = ("shmeckles", "flurbos", "credits")
+
+
+def _nbytes(bits: int) -> int:
+    return (bits + 7) >> 3
+
+
+def _set_bits(bitmap: np.ndarray, ids) -> None:
+    ids = np.asarray(ids, dtype=np.int64)
+    # ufunc.at, а не bitmap[...] |= ...: несколько id могут попасть в один байт
+    np.bitwise_or.at(bitmap, ids >> 3, (0x80 >> (ids & 7)).astype(np.uint8))
+
+
+def _clear_bits(bitmap: np.ndarray, ids) -> None:
+    ids = np.asarray(ids, dtype=np.int64)
+    np.bitwise_and.at(bitmap, ids >> 3, ~(0x80 >> (ids & 7)).astype(np.uint8))
+
+
+class FacetIndex:
+    """Bitmap-индекс: категории и цены товаров по их id"""
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.built_at = 0.0
+        self._building = False
+        self._journal: List[Tuple] = []
+        self._lock = asyncio.Lock()
+        self._reset(0)
+
+    def _reset(self, capacity: int) -> None:
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.category = np.full(capacity, -1, dtype=np.int64)
+        self.prices = {c: np.full(capacity, np.nan) for c in PRICE_CURRENCIES}
+        # Упакованные маски категорий (uint8), каждая своей длины
+        self.bitmaps: Dict[int, np.ndarray] = {}
+        # Кэш порядка (цена, id) по валютам для сортированной выдачи
+        self._orders: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+    # ---------- построение и обновление ----------
+
+    def load(
+        self,
+        ids: np.ndarray,
+        category_ids: np.ndarray,
+        prices: Dict[str, np.ndarray],
+    ) -> None:
+        """Полная пересборка из массивов (id, категория, цены)"""
+        capacity = int(ids.max()) + 1 if len(ids) else 0
+        self._reset(capacity)
+        self.alive[ids] = True
+        self.category[ids] = category_ids
+        for currency in PRICE_CURRENCIES:
+            self.prices[currency][ids] = prices[currency]
+
+        # Маски категорий: группируем id по категории одной сортировкой
+        order = np.argsort(category_ids, kind="stable")
+        cats, starts = np.unique(category_ids[order], return_index=True)
+        for cat, chunk in zip(cats.tolist(), np.split(ids[order], starts[1:])):
+            bitmap = np.zeros(_nbytes(int(chunk.max()) + 1), dtype=np.uint8)
+            _set_bits(bitmap, chunk)
+            self.bitmaps[cat] = bitmap
+
+        self.ready = True
+        self.built_at = time.time()
+
+    def _grow(self, product_id: int) -> None:
+        size = len(self.alive)
+        if product_id < size:
+            return
+        capacity = max(product_id + 1, size * 2, 1024)
+        pad = capacity - size
+        self.alive = np.concatenate([self.alive, np.zeros(pad, dtype=bool)])
+        self.category = np.concatenate([self.category, np.full(pad, -1, dtype=np.int64)])
+        for currency in PRICE_CURRENCIES:
+            self.prices[currency] = np.concatenate([self.prices[currency], np.full(pad, np.nan)])
+
+    def _bitmap(self, category_id: int, product_id: int) -> np.ndarray:
+        """
+        Маска категории, вмещающая product_id. Растёт только эта маска
+        (с удвоением, но не длиннее массивов индекса), остальные не трогаем.
+        """
+        bitmap = self.bitmaps.get(category_id)
+        size = _nbytes(product_id + 1)
+        if bitmap is None or len(bitmap) < size:
+            current = 0 if bitmap is None else len(bitmap)
+            grown = np.zeros(min(max(size, current * 2), _nbytes(len(self.alive))), dtype=np.uint8)
+            if bitmap is not None:
+                grown[:current] = bitmap
+            bitmap = self.bitmaps[category_id] = grown
+        return bitmap
+
+    def _unpack(self, bitmap: np.ndarray) -> np.ndarray:
+        """Упакованная маска -> bool-маска длины индекса"""
+        mask = np.zeros(len(self.alive), dtype=bool)
+        bits = np.unpackbits(bitmap, count=min(len(bitmap) * 8, len(mask))).view(bool)
+        mask[:len(bits)] = bits
+        return mask
+
+    def upsert(self, product_id: int, category_id: int, prices: Dict[str, float]) -> None:
+        """Добавляет или обновляет товар"""
+        if self._building:
+            self._journal.append(("upsert", product_id, category_id, prices))
+        self._grow(product_id)
+        old_category = int(self.category[product_id])
+        if self.alive[product_id] and old_category != category_id:
+            _clear_bits(self.bitmaps[old_category], product_id)
+        self.alive[product_id] = True
+        self.category[product_id] = category_id
+        _set_bits(self._bitmap(category_id, product_id), product_id)
+        for currency in PRICE_CURRENCIES:
+            self.prices[currency][product_id] = prices[currency]
+        self._orders.clear()
+
+    def upsert_product(self, product: ProductModel) -> None:
+        self.upsert(
+            product.id,
+            product.category_id,
+            {c: getattr(product, f"price_{c}") for c in PRICE_CURRENCIES},
+        )
+
+    def upsert_many(
+        self,
+        product_ids: np.ndarray,
+        category_ids: np.ndarray,
+        prices: Dict[str, np.ndarray],
+    ) -> None:
+        """Пакетный upsert (id без повторов) — массовый импорт"""
+        if self._building:
+            self._journal.append(("upsert_many", product_ids, category_ids, prices))
+        if not len(product_ids):
+            return
+        self._grow(int(product_ids.max()))
+        # Снимаем биты старых категорий у уже известных товаров
+        known = self.alive[product_ids]
+        old_categories = self.category[product_ids]
+        for cat in np.unique(old_categories[known]).tolist():
+            _clear_bits(self.bitmaps[cat], product_ids[known & (old_categories == cat)])
+        self.alive[product_ids] = True
+        self.category[product_ids] = category_ids
+        for cat in np.unique(category_ids).tolist():
+            chunk = product_ids[category_ids == cat]
+            _set_bits(self._bitmap(cat, int(chunk.max())), chunk)
+        for currency in PRICE_CURRENCIES:
+            self.prices[currency][product_ids] = prices[currency]
+        self._orders.clear()
+
+    def remove(self, product_id: int) -> None:
+        """Убирает товар из индекса"""
+        if self._building:
+            self._journal.append(("remove", product_id))
+        if product_id >= len(self.alive) or not self.alive[product_id]:
+            return
+        _clear_bits(self.bitmaps[int(self.category[product_id])], product_id)
+        self.alive[product_id] = False
+        self.category[product_id] = -1
+        self._orders.clear()
+
+    def remove_category(self, category_id: int) -> None:
+        """Убирает все товары категории (удаление категории каскадом)"""
+        if self._building:
+            self._journal.append(("remove_category", category_id))
+        bitmap = self.bitmaps.pop(category_id, None)
+        if bitmap is None:
+            return
+        mask = self._unpack(bitmap)
+        self.alive &= ~mask
+        self.category[mask] = -1
+        self._orders.clear()
+
+    def _replay(self, journal: Iterable[Tuple]) -> None:
+        for op, *args in journal:
+            getattr(self, op)(*args)
+
+    # ---------- запросы ----------
+
+    def match(
+        self,
+        category_ids: Optional[Sequence[int]] = None,
+        currency: str = "shmeckles",
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+    ) -> np.ndarray:
+        """Маска товаров, подходящих под фильтры"""
+        if category_ids:
+            # OR по упакованным маскам (в 8 раз меньше памяти), распаковка — одна
+            packed = np.zeros(_nbytes(len(self.alive)), dtype=np.uint8)
+            for category_id in set(category_ids):
+                bitmap = self.bitmaps.get(category_id)
+                if bitmap is not None:
+                    packed[:len(bitmap)] |= bitmap
+            mask = self._unpack(packed)
+        else:
+            mask = self.alive.copy()
+
+        prices = self.prices[currency]
+        if price_min is not None:
+            mask &= prices >= price_min
+        if price_max is not None:
+            mask &= prices <= price_max
+        return mask
+
+    def _order(self, currency: str) -> np.ndarray:
+        """id живых товаров в порядке (цена, id)"""
+        order = self._orders.get(currency)
+        if order is None:
+            ids = np.flatnonzero(self.alive)
+            order = ids[np.lexsort((ids, self.prices[currency][ids]))]
+            self._orders[currency] = order
+        return order
+
+    def page(
+        self,
+        mask: np.ndarray,
+        sort_currency: Optional[str],
+        descending: bool,
+        after: Optional[Tuple[Optional[float], int]],
+        limit: int,
+    ) -> Tuple[List[int], Optional[List[float]]]:
+        """
+        Keyset-страница по маске: до limit+1 id (лишний — признак следующей
+        страницы) и значения сортировки. Порядок совпадает с SQL-выдачей.
+        """
+        if sort_currency is None:
+            ids = np.flatnonzero(mask)
+            if after is not None:
+                ids = ids[np.searchsorted(ids, after[1], side="right"):]
+            return ids[:limit + 1].tolist(), None
+
+        order = self._order(sort_currency)
+        if descending:
+            order = order[::-1]
+        ids = order[mask[order]]
+        values = self.prices[sort_currency][ids]
+        if after is not None:
+            last_value, last_id = after
+            if descending:
+                keep = (values < last_value) | ((values == last_value) & (ids < last_id))
+            else:
+                keep = (values > last_value) | ((values == last_value) & (ids > last_id))
+            ids, values = ids[keep], values[keep]
+        return ids[:limit + 1].tolist(), values[:limit + 1].tolist()
+
+    def facets(
+        self,
+        category_ids: Optional[Sequence[int]] = None,
+        currency: str = "shmeckles",
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        buckets: int = settings.facet_price_buckets,
+    ) -> Dict:
+        """
+        Число товаров по фильтрам, по категориям (без учёта фильтра категорий)
+        и гистограмма цен (без учёта фильтра цены) — как обычно для фасетов.
+        """
+        total = int(np.count_nonzero(self.match(category_ids, currency, price_min, price_max)))
+
+        by_price = np.packbits(self.match(None, currency, price_min, price_max))
+        scratch = np.empty_like(by_price)
+        categories = []
+        for cat, bitmap in sorted(self.bitmaps.items()):
+            size = len(bitmap)
+            both = np.bitwise_and(bitmap, by_price[:size], out=scratch[:size])
+            count = int(np.bitwise_count(both).sum())
+            if count:
+                categories.append({"category_id": cat, "count": count})
+
+        values = self.prices[currency][self.match(category_ids, currency)]
+        histogram = []
+        if len(values):
+            low, high = float(values.min()), float(values.max())
+            if high <= low:
+                buckets = 1
+            width = (high - low) / buckets or 1.0
+            # Равные интервалы: номер интервала считается арифметикой, без сортировки
+            slots = np.minimum(((values - low) / width).astype(np.int64), buckets - 1)
+            histogram = [
+                {
+                    "min": round(low + i * width, 2),
+                    "max": round(high if i == buckets - 1 else low + (i + 1) * width, 2),
+                    "count": count,
+                }
+                for i, count in enumerate(np.bincount(slots, minlength=buckets).tolist())
+            ]
+
+        return {
+            "total": total,
+            "currency": currency,
+            "categories": categories,
+            "price_histogram": histogram,
+        }
+
+    # ---------- загрузка из БД ----------
+
+    async def rebuild(self, session: AsyncSession) -> int:
+        """
+        Перестраивает индекс по таблице products. Изменения, пришедшие
+        во время загрузки, записываются в журнал и применяются поверх.
+        """
+        async with self._lock:
+            self._building = True
+            self._journal = []
+            try:
+                result = await session.execute(
+                    select(
+                        ProductModel.id,
+                        ProductModel.category_id,
+                        *(getattr(ProductModel, f"price_{c}") for c in PRICE_CURRENCIES),
+                    )
+                )
+                rows = result.all()
+            finally:
+                self._building = False
+            journal, self._journal = self._journal, []
+
+            columns = list(zip(*rows)) if rows else [()] * (2 + len(PRICE_CURRENCIES))
+            self.load(
+                np.array(columns[0], dtype=np.int64),
+                np.array(columns[1], dtype=np.int64),
+                {
+                    c: np.array(columns[2 + i], dtype=np.float64)
+                    for i, c in enumerate(PRICE_CURRENCIES)
+                },
+            )
+            self._replay(journal)
+            return len(rows)
+
+
+facet_index = FacetIndex()
+
+
+async def ensure_facet_index(session: AsyncSession) -> FacetIndex:
+    """Индекс, построенный хотя бы раз (первый запрос строит его сам)"""
+    if not facet_index.ready:
+        await facet_index.rebuild(session)
+    return facet_index
+
+
+async def facet_index_refresher(
+    interval: float = settings.facet_index_rebuild_interval,
+) -> None:
+    """Фоновая задача: строит индекс при старте и периодически перестраивает"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                started = time.perf_counter()
+                count = await facet_index.rebuild(session)
+            logger.info(
+                f"🧮 Индекс фасетов перестроен: {count} товаров "
+                f"за {(time.perf_counter() - started) * 1000:.1f} мс"
+            )
+        except Exception as e:
+            logger.exception(f"❌ Ошибка построения индекса фасетов: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,163 @@
+# services/image_service.py
+"""
+Фоновая генерация производных изображений товаров.
+
+Ресайз и кодирование выполняются в пуле процессов (utils.images.render_variants),
+поэтому воркеры API не тратят на них CPU. Результат сохраняется в
+products.image_variants, а GET /products/{id}/image отдаёт клиенту
+подходящий вариант.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select, update
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.static import resolve_static_path
+from core.storage import VARIANTS_DIR, VARIANTS_URL
+from models.product import Product as ProductModel
+from services.product_service import invalidate_product_cache
+from utils.images import render_variants
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Ссылки на запущенные задачи, чтобы их не собрал GC
+_tasks: Set[asyncio.Task] = set()
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: дочерние процессы не наследуют event loop и соединения с БД
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.image_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def generate_image_variants(product_id: int, image_url: str) -> Optional[dict]:
+    """
+    Строит варианты изображения и записывает их товару.
+    Если за это время изображение товара сменилось, результат выбрасывается.
+    """
+    variants, updated = await _generate_shared_variants(image_url, [product_id])
+    return variants if updated else None
+
+
+async def _generate_shared_variants(
+    image_url: str,
+    product_ids: Sequence[int],
+) -> Tuple[Optional[dict], List[int]]:
+    """
+    Рендерит варианты image_url один раз и записывает их всем товарам
+    из product_ids, у которых это изображение всё ещё стоит.
+    Возвращает (варианты, id обновлённых товаров).
+    """
+    source = resolve_static_path(image_url)
+    if source is None:
+        logger.warning(f"⚠️ Исходник изображения не найден: {image_url}")
+        return None, []
+
+    loop = asyncio.get_running_loop()
+    variants = await loop.run_in_executor(
+        get_image_pool(),
+        render_variants,
+        str(source),
+        str(VARIANTS_DIR),
+        VARIANTS_URL,
+    )
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(ProductModel)
+            .where(ProductModel.id.in_(list(product_ids)), ProductModel.image_url == image_url)
+            .values(image_variants=variants)
+            .returning(ProductModel.id)
+        )
+        # Товары, у которых изображение уже заменили или удалили, не попадут сюда;
+        # файлы вариантов удалит GC вместе с блобом
+        updated = list(result.scalars())
+        await session.commit()
+
+    for product_id in updated:
+        invalidate_product_cache(product_id, lists=False)
+    if updated:
+        logger.info(f"🖼️ Варианты изображения готовы для товаров {updated}: {image_url}")
+    return variants, updated
+
+
+def schedule_image_variants(product_id: int, image_url: str) -> None:
+    """Запускает генерацию вариантов в фоне, не дожидаясь результата"""
+
+    async def run() -> None:
+        try:
+            await generate_image_variants(product_id, image_url)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка генерации вариантов для товара {product_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def schedule_image_backfill() -> None:
+    """Запускает backfill_image_variants в фоне (например, после массового импорта)"""
+
+    async def run() -> None:
+        try:
+            await backfill_image_variants()
+        except Exception as e:
+            logger.exception(f"❌ Ошибка генерации вариантов изображений: {e}")
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def backfill_image_variants() -> int:
+    """Строит варианты для всех товаров, у которых их ещё нет (seed, старые загрузки)"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(ProductModel.id, ProductModel.image_url).where(
+                ProductModel.image_url.is_not(None),
+                ProductModel.image_variants.is_(None),
+            )
+        )
+        pending = result.all()
+
+    # Один рендер на изображение: после дедупликации загрузок и импорта
+    # одну картинку часто используют много товаров
+    by_url: Dict[str, List[int]] = defaultdict(list)
+    for row in pending:
+        by_url[row.image_url].append(row.id)
+
+    limit = asyncio.Semaphore(settings.image_workers * 2)
+
+    async def run(image_url: str, product_ids: List[int]) -> int:
+        async with limit:
+            try:
+                _, updated = await _generate_shared_variants(image_url, product_ids)
+                return len(updated)
+            except Exception as e:
+                logger.exception(f"❌ Ошибка генерации вариантов для {image_url}: {e}")
+                return 0
+
+    done = sum(await asyncio.gather(*(run(url, ids) for url, ids in by_url.items())))
+    if pending:
+        logger.info(f"🖼️ Сгенерированы варианты изображений: {done} из {len(pending)}")
+    return done
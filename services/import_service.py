@@ -0,0 +1,309 @@
+# services/import_service.py
+"""
+Массовый импорт товаров из CSV или JSONL.
+
+Файл читается потоково, пачками по IMPORT_BATCH_SIZE строк: разбор
+и валидация ProductCreate идут в пуле потоков, категории по имени
+берутся из реестра, загруженного одним запросом на весь импорт, запись —
+многострочными INSERT (строки с id — upsert по id), коммит на пачку.
+Ошибочные строки не останавливают импорт и попадают в отчёт.
+
+Колонки — поля ProductCreate; вместо category_id можно указать
+category (имя категории). Пустые ячейки CSV считаются отсутствующими.
+"""
+
+import csv
+import itertools
+import json
+import logging
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import case, insert, null, select, text
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from core.cache import catalog_cache, catalog_miss_cache
+from core.catalog_version import catalog_version
+from core.category_registry import category_registry
+from core.config import settings
+from core.database import upsert_insert
+from models.product import Product as ProductModel
+from schemas.product import ProductImportError, ProductImportResult
+from schemas.product_create import ProductImportRow
+from services.facet_service import PRICE_CURRENCIES, facet_index
+from services.media_service import release_product_images, retain_product_images
+from services.search_service import get_search_backend
+from utils.telegram import enqueue_telegram_message, escape_md
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}
+
+# Что возвращает INSERT ... RETURNING: хватает для поиска и индекса фасетов
+_RETURNING = (
+    ProductModel.id,
+    ProductModel.name,
+    ProductModel.description,
+    ProductModel.category_id,
+    ProductModel.price_shmeckles,
+    ProductModel.price_flurbos,
+    ProductModel.price_credits,
+    ProductModel.image_url,
+)
+
+Record = Tuple[int, Any]  # (номер строки, dict или текст ошибки разбора)
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """Формат по расширению файла"""
+    return IMPORT_FORMATS.get(Path(filename or "").suffix.lower().lstrip("."))
+
+
+def iter_records(stream: IO[str], fmt: str) -> Iterator[Record]:
+    """Потоково читает записи файла, не загружая его целиком"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Лишние ячейки (ключ None) и пустые значения отбрасываем
+            yield reader.line_num, {k: v for k, v in record.items() if k and v not in ("", None)}
+        return
+
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Некорректный JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, "Ожидается JSON-объект"
+            continue
+        yield line_no, record
+
+
+def _format_validation_error(exc: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in exc.errors()
+    ]
+
+
+def _validate_record(
+    record: Any,
+    categories: Dict[str, int],
+    category_ids: Set[int],
+) -> Union[ProductImportRow, List[str]]:
+    """ProductImportRow или список ошибок строки"""
+    if isinstance(record, str):
+        return [record]
+    name = record.pop("category", None)
+    if "category_id" not in record and name is not None:
+        if name not in categories:
+            return [f"Категория «{name}» не найдена"]
+        record["category_id"] = categories[name]
+    try:
+        row = ProductImportRow.model_validate(record)
+    except ValidationError as e:
+        return _format_validation_error(e)
+    # SQLite не проверяет внешние ключи — проверяем по реестру
+    if row.category_id not in category_ids:
+        return ["Категория не найдена"]
+    return row
+
+
+def _prepare_chunk(
+    records: Iterator[Record],
+    size: int,
+    categories: Dict[str, int],
+) -> Tuple[int, List[Tuple[int, ProductImportRow]], List[ProductImportError]]:
+    """
+    Читает и валидирует до size записей (выполняется в пуле потоков).
+    Возвращает число прочитанных записей, годные строки и ошибки.
+    """
+    category_ids = set(categories.values())
+    rows: Dict[Any, Tuple[int, ProductImportRow]] = {}
+    errors: List[ProductImportError] = []
+    read = 0
+
+    for line, record in itertools.islice(records, size):
+        read += 1
+        row = _validate_record(record, categories, category_ids)
+        if isinstance(row, list):
+            errors.append(ProductImportError(line=line, errors=row))
+            continue
+        key = row.id if row.id is not None else ("line", line)
+        if key in rows:
+            # Один id дважды в пачке upsert не переварит — берём последнюю строку
+            previous_line, _ = rows.pop(key)
+            errors.append(
+                ProductImportError(
+                    line=previous_line,
+                    errors=[f"id {row.id} повторяется в строке {line}"],
+                )
+            )
+        rows[key] = (line, row)
+
+    return read, list(rows.values()), errors
+
+
+async def _sync_id_sequence(session: AsyncSession) -> None:
+    # Явные id в Postgres не двигают последовательность — иначе следующий INSERT упадёт
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('products', 'id'), "
+            "(SELECT coalesce(max(id), 1) FROM products))"
+        ))
+
+
+async def _write_chunk(
+    session: AsyncSession,
+    rows: List[ProductImportRow],
+) -> Tuple[List[Any], int]:
+    """
+    Записывает пачку: строки с id — одним upsert, новые товары — одним
+    многострочным INSERT. Возвращает записанные строки и число обновлённых.
+    """
+    table = ProductModel.__table__
+    new = [row.model_dump(exclude={"id"}) for row in rows if row.id is None]
+    existing = [row.model_dump() for row in rows if row.id is not None]
+    written: List[Any] = []
+    updated = 0
+
+    if existing:
+        ids = [row["id"] for row in existing]
+        updated = len((await session.execute(select(table.c.id).where(table.c.id.in_(ids)))).all())
+        # Старые изображения отпускаем до перезаписи image_url
+        await release_product_images(session, ids)
+        stmt = upsert_insert(session, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={
+                **{column: stmt.excluded[column] for column in existing[0] if column != "id"},
+                # Варианты старого изображения больше не подходят — их построят заново
+                "image_variants": case(
+                    (
+                        table.c.image_url.is_not_distinct_from(stmt.excluded.image_url),
+                        table.c.image_variants,
+                    ),
+                    else_=null(),
+                ),
+            },
+        )
+        result = await session.execute(stmt.returning(*_RETURNING), existing)
+        written.extend(result.all())
+        # Сдвигаем последовательность до INSERT новых строк этой пачки:
+        # иначе они (и следующие пачки) получат уже занятый id
+        await _sync_id_sequence(session)
+
+    if new:
+        result = await session.execute(insert(table).returning(*_RETURNING), new)
+        written.extend(result.all())
+
+    ids = [row.id for row in written]
+    await retain_product_images(session, ids)
+    await get_search_backend(session).index_products(session, written)
+    return written, updated
+
+
+def _index_facets(written: List[Any]) -> None:
+    def column(name: str, dtype) -> np.ndarray:
+        return np.fromiter((getattr(row, name) for row in written), dtype=dtype, count=len(written))
+
+    facet_index.upsert_many(
+        column("id", np.int64),
+        column("category_id", np.int64),
+        {c: column(f"price_{c}", np.float64) for c in PRICE_CURRENCIES},
+    )
+
+
+async def import_products(
+    session: AsyncSession,
+    stream: IO[str],
+    fmt: str,
+    batch_size: int = settings.import_batch_size,
+    source: str = "",
+) -> ProductImportResult:
+    """
+    Импортирует товары из потока stream (CSV или JSONL).
+    Каждая пачка коммитится отдельно; в конце — одно сводное уведомление.
+    """
+    if fmt not in IMPORT_FORMATS.values():
+        raise ValueError("Неизвестный формат файла: ожидается csv или jsonl")
+
+    started = time.perf_counter()
+    # Имена категорий — одним запросом на весь импорт
+    await category_registry.load(session)
+    categories = {category.name: category.id for category in category_registry.all()}
+
+    records = iter_records(stream, fmt)
+    total = created = updated = failed = 0
+    errors: List[ProductImportError] = []
+
+    def report(chunk_errors: List[ProductImportError]) -> None:
+        nonlocal failed
+        failed += len(chunk_errors)
+        errors.extend(chunk_errors[:max(settings.import_max_errors - len(errors), 0)])
+
+    try:
+        while True:
+            read, rows, chunk_errors = await run_in_threadpool(
+                _prepare_chunk, records, batch_size, categories
+            )
+            if not read:
+                break
+            total += read
+            report(chunk_errors)
+            if not rows:
+                continue
+
+            try:
+                written, chunk_updated = await _write_chunk(session, [row for _, row in rows])
+                await session.commit()
+            except (IntegrityError, DataError) as e:
+                await session.rollback()
+                report([
+                    ProductImportError(line=line, errors=[f"Пачка не записана: {e.orig}"])
+                    for line, _ in rows
+                ])
+                continue
+
+            created += len(written) - chunk_updated
+            updated += chunk_updated
+            _index_facets(written)
+            logger.info(f"📥 Импорт товаров: прочитано {total}, записано {created + updated}")
+    finally:
+        if created or updated:
+            catalog_cache.clear()
+            catalog_miss_cache.clear()
+            catalog_version.bump()
+
+    result = ProductImportResult(
+        total=total,
+        created=created,
+        updated=updated,
+        failed=failed,
+        errors=errors,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    if total:
+        enqueue_telegram_message(session, _summary_message(result, source))
+    await session.commit()
+    return result
+
+
+def _summary_message(result: ProductImportResult, source: str) -> str:
+    return f"""📥 *Импорт товаров*
+
+📄 *Файл:* {escape_md(source) if source else '—'}
+🧾 *Строк:* {result.total}
+🆕 *Создано:* {result.created}
+🔄 *Обновлено:* {result.updated}
+❌ *С ошибками:* {result.failed}
+⏱ *Время:* {result.elapsed_ms / 1000:.1f} с
+"""
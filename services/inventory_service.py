@@ -0,0 +1,248 @@
+# services/inventory_service.py
+"""
+Резервирование товара под корзины.
+
+Добавление в корзину не меняет строку товара: оно ставит или продлевает
+холд строки корзины в журнале stock_reservations с истекающим сроком.
+Строка товара только блокируется (SELECT ... FOR UPDATE), чтобы две корзины
+не заняли одну и ту же единицу. Блокировка берётся последней: после неё
+идёт единственный запрос «проверка остатка + запись холда» и сразу коммит.
+Так что добавления одного горячего товара всё равно выстраиваются в очередь,
+но каждое держит строку на один запрос, а не на всю транзакцию.
+Доступный остаток = products.quantity минус активные холды других корзин,
+считается по покрывающему индексу (product_id, expires_at, quantity). Просроченные
+холды не учитываются сразу, а физически удаляются пакетами фоновой задачей.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from core.config import settings
+from core.database import AsyncSessionLocal, upsert_insert
+from models.inventory import StockReservation
+from models.product import Product
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def held_by_others(product_id, cart_id: Optional[int], now: datetime):
+    """Скалярный подзапрос: сумма активных холдов товара, кроме холдов cart_id"""
+    query = select(func.coalesce(func.sum(StockReservation.quantity), 0)).where(
+        StockReservation.product_id == product_id,
+        StockReservation.expires_at > now,
+    )
+    if cart_id is not None:
+        query = query.where(StockReservation.cart_id != cart_id)
+    return query.scalar_subquery()
+
+
+async def lock_products(session: AsyncSession, product_ids: Iterable[int]) -> None:
+    """
+    Блокирует строки товаров до конца транзакции (по возрастанию id — без
+    взаимоблокировок): проверки остатка конкурирующих корзин идут по очереди.
+    Вызывать непосредственно перед запросом, который проверяет остаток и пишет
+    холд, и коммитить сразу после него — блокировка держится до коммита.
+    Отдельным запросом, а не в том же: в Postgres запрос видит снимок на свой
+    старт, и холд, закоммиченный пока он ждал блокировку, проверка бы не учла.
+    В SQLite FOR UPDATE не нужен — пишущая транзакция там одна на всю БД.
+    """
+    ids = sorted(set(product_ids))
+    if ids:
+        await session.execute(
+            select(Product.id).where(Product.id.in_(ids)).order_by(Product.id).with_for_update()
+        )
+
+
+async def get_available_quantity(
+    session: AsyncSession,
+    product_id: int,
+    cart_id: Optional[int] = None,
+) -> Optional[int]:
+    """Доступный остаток товара (None — товара нет)"""
+    result = await session.execute(
+        select(Product.quantity - held_by_others(Product.id, cart_id, utcnow()))
+        .where(Product.id == product_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_free_quantities(
+    session: AsyncSession,
+    product_ids: Iterable[int],
+    cart_id: Optional[int] = None,
+    lock: bool = False,
+) -> Dict[int, int]:
+    """
+    Свободные остатки сразу для многих товаров одним запросом.
+    lock=True — строки товаров блокируются до конца транзакции
+    (остаток проверяется, а холды пишутся следом).
+    """
+    query = select(
+        Product.id,
+        Product.quantity - held_by_others(Product.id, cart_id, utcnow()),
+    ).where(Product.id.in_(list(product_ids)))
+    if lock:
+        query = query.order_by(Product.id).with_for_update(of=Product)
+    result = await session.execute(query)
+    return {product_id: free for product_id, free in result.all()}
+
+
+def hold_expires_at(now: datetime) -> datetime:
+    return now + timedelta(seconds=settings.reservation_ttl)
+
+
+def hold_upsert(session: AsyncSession, source: Select):
+    """
+    INSERT ... SELECT холда из source (product_id, cart_id, quantity, expires_at);
+    существующий холд корзины на товар обновляется и продлевается.
+    """
+    stmt = upsert_insert(session, StockReservation).from_select(
+        ["product_id", "cart_id", "quantity", "expires_at"],
+        source,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[StockReservation.cart_id, StockReservation.product_id],
+        set_={
+            "quantity": stmt.excluded.quantity,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+
+
+def free_quantity(product_id: int, cart_id: Optional[int], now: datetime):
+    """Скалярный подзапрос: свободный остаток товара для корзины cart_id"""
+    return (
+        select(Product.quantity - held_by_others(Product.id, cart_id, now))
+        .where(Product.id == product_id)
+        .scalar_subquery()
+    )
+
+
+async def reserve_stock(
+    session: AsyncSession,
+    cart_id: int,
+    product_id: int,
+    quantity: int,
+    check: bool = True,
+) -> bool:
+    """
+    Ставит (или продлевает) холд корзины на quantity единиц товара.
+    Проверка остатка и запись — один INSERT ... SELECT ... ON CONFLICT
+    под блокировкой строки товара, после которого транзакция сразу
+    коммитится (вызывать последним шагом). check=False — остаток уже
+    проверен вызывающим кодом: только запись, без блокировки и коммита.
+    Возвращает False, если свободного остатка не хватает.
+    """
+    now = utcnow()
+    source = select(
+        Product.id,
+        literal(cart_id),
+        literal(quantity),
+        literal(hold_expires_at(now), StockReservation.expires_at.type),
+    ).where(Product.id == product_id)
+    if check:
+        source = source.where(
+            Product.quantity - held_by_others(Product.id, cart_id, now) >= quantity
+        )
+        await lock_products(session, [product_id])
+
+    result = await session.execute(hold_upsert(session, source))
+    if check:
+        await session.commit()
+    return result.rowcount == 1
+
+
+async def hold_stock_many(
+    session: AsyncSession,
+    cart_id: int,
+    quantities: Dict[int, int],
+) -> None:
+    """
+    Ставит или продлевает холды корзины по многим товарам одним
+    многострочным upsert'ом. Остатки должны быть проверены заранее.
+    """
+    if not quantities:
+        return
+    expires_at = hold_expires_at(utcnow())
+    stmt = upsert_insert(session, StockReservation).values(
+        [
+            {
+                "cart_id": cart_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "expires_at": expires_at,
+            }
+            for product_id, quantity in quantities.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockReservation.cart_id, StockReservation.product_id],
+        set_={
+            "quantity": stmt.excluded.quantity,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def release_stock(
+    session: AsyncSession,
+    cart_id: int,
+    product_ids: Optional[Iterable[int]] = None,
+) -> None:
+    """Снимает холды корзины (все или только по указанным товарам)"""
+    stmt = delete(StockReservation).where(StockReservation.cart_id == cart_id)
+    if product_ids is not None:
+        stmt = stmt.where(StockReservation.product_id.in_(list(product_ids)))
+    await session.execute(stmt)
+
+
+async def release_expired_reservations(
+    session: AsyncSession,
+    batch_size: int = settings.reservation_sweep_batch,
+) -> int:
+    """
+    Удаляет просроченные холды пакетами по batch_size, коммитя каждый пакет,
+    чтобы не держать долгих блокировок. Возвращает число удалённых строк.
+    """
+    now = utcnow()
+    total = 0
+    while True:
+        expired_ids = (
+            select(StockReservation.id)
+            .where(StockReservation.expires_at <= now)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = await session.execute(
+            delete(StockReservation).where(StockReservation.id.in_(expired_ids))
+        )
+        await session.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+
+async def reservation_sweeper(
+    interval: float = settings.reservation_sweep_interval,
+) -> None:
+    """Фоновая задача: периодически освобождает просроченные резервы"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                released = await release_expired_reservations(session)
+            if released:
+                logger.info(f"🧹 Освобождено просроченных резервов: {released}")
+        except Exception as e:
+            logger.exception(f"❌ Ошибка очистки резервов: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,293 @@
+# services/media_service.py
+"""
+Учёт ссылок на загруженные изображения и сборка мусора.
+
+Каждый файл content-addressed хранилища (core.storage) — строка image_blobs
+со счётчиком товаров, которые на него ссылаются. Счётчик меняется в той же
+транзакции, что и products.image_url. Сборщик мусора удаляет пакетами блобы
+без ссылок, пролежавшие дольше grace-периода, а также файлы на диске,
+для которых нет строки (оборванные загрузки, старый формат uploads/products/<uuid>).
+
+Гонка «GC удаляет — загрузка публикует тот же файл» исключена порядком действий:
+загрузка сначала делает upsert строки блоба (и ждёт блокировку, если GC её
+удаляет), и только потом переносит файл; GC держит блокировку строк, пока
+не удалит файлы.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+from fastapi import UploadFile
+from sqlalchemy import case, delete, exists, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.database import AsyncSessionLocal, upsert_insert
+from core.storage import (
+    TEMP_PREFIX,
+    UPLOAD_DIR,
+    UPLOAD_URL,
+    StagedUpload,
+    blob_url,
+    delete_blob_files,
+    delete_upload_file,
+    discard_staged_upload,
+    iter_stale_files,
+    publish_staged_upload,
+    stage_image_upload,
+)
+from models.blob import ImageBlob
+from models.product import Product as ProductModel
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def register_blob(session: AsyncSession, staged: StagedUpload) -> str:
+    """Создаёт (или освежает) строку блоба. Возвращает URL файла."""
+    url = blob_url(staged.digest, staged.ext)
+    now = utcnow()
+    stmt = upsert_insert(session, ImageBlob).values(
+        digest=staged.digest,
+        url=url,
+        size=staged.size,
+        ref_count=0,
+        updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ImageBlob.digest],
+        set_={"updated_at": now},
+    )
+    await session.execute(stmt)
+    return url
+
+
+async def save_product_image(session: AsyncSession, file: UploadFile) -> str:
+    """
+    Сохраняет загрузку в хранилище и возвращает её URL.
+    Ссылку на блоб нужно учесть (retain_image) в той же транзакции.
+    """
+    staged = await stage_image_upload(file)
+    try:
+        url = await register_blob(session, staged)
+        await run_in_threadpool(publish_staged_upload, staged)
+    except Exception:
+        await run_in_threadpool(discard_staged_upload, staged)
+        raise
+    return url
+
+
+async def retain_image(session: AsyncSession, image_url: Optional[str]) -> None:
+    """+1 ссылка на блоб (для картинок не из хранилища ничего не делает)"""
+    if image_url:
+        await session.execute(
+            update(ImageBlob)
+            .where(ImageBlob.url == image_url)
+            .values(ref_count=ImageBlob.ref_count + 1, updated_at=utcnow())
+        )
+
+
+async def release_image(session: AsyncSession, image_url: Optional[str]) -> None:
+    """-1 ссылка на блоб"""
+    if image_url:
+        await session.execute(
+            update(ImageBlob)
+            .where(ImageBlob.url == image_url)
+            .values(ref_count=ImageBlob.ref_count - 1, updated_at=utcnow())
+        )
+
+
+async def swap_product_image(
+    session: AsyncSession,
+    product_id: int,
+    image_url: Optional[str],
+) -> None:
+    """
+    Перевешивает ссылку товара на новое изображение одним UPDATE:
+    +1 новому блобу, -1 старому, ничего — если URL не меняется.
+    Старый URL читается подзапросом, поэтому вызывать до UPDATE товара.
+    """
+    current = (
+        select(ProductModel.image_url)
+        .where(ProductModel.id == product_id)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(ImageBlob)
+        .where(
+            or_(ImageBlob.url == image_url, ImageBlob.url == current),
+            current.is_distinct_from(image_url),
+        )
+        .values(
+            ref_count=ImageBlob.ref_count + case((ImageBlob.url == image_url, 1), else_=-1),
+            updated_at=utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _shift_product_image_refs(
+    session: AsyncSession,
+    product_ids: Union[Iterable[int], Select],
+    sign: int,
+) -> None:
+    if not isinstance(product_ids, Select):
+        product_ids = list(product_ids)
+    refs = (
+        select(func.count())
+        .where(ProductModel.image_url == ImageBlob.url, ProductModel.id.in_(product_ids))
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(ImageBlob)
+        .where(
+            ImageBlob.url.in_(
+                select(ProductModel.image_url).where(ProductModel.id.in_(product_ids))
+            )
+        )
+        .values(ref_count=ImageBlob.ref_count + sign * refs, updated_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def release_product_images(
+    session: AsyncSession,
+    product_ids: Union[Iterable[int], Select],
+) -> None:
+    """
+    Снимает ссылки всех указанных товаров одним UPDATE
+    (товары удаляются пачкой, например вместе с категорией).
+    """
+    await _shift_product_image_refs(session, product_ids, -1)
+
+
+async def retain_product_images(
+    session: AsyncSession,
+    product_ids: Union[Iterable[int], Select],
+) -> None:
+    """Учитывает ссылки пачки товаров одним UPDATE (массовый импорт)"""
+    await _shift_product_image_refs(session, product_ids, 1)
+
+
+async def collect_unreferenced_blobs(
+    session: AsyncSession,
+    batch_size: int = settings.blob_gc_batch,
+    grace: float = settings.blob_gc_grace,
+) -> int:
+    """
+    Удаляет пакетами блобы без ссылок, не менявшиеся дольше grace.
+    Строки удаляются до файлов, коммит — после: параллельная загрузка того же
+    содержимого ждёт на блокировке строки и публикует файл уже после GC.
+    """
+    cutoff = utcnow() - timedelta(seconds=grace)
+    referenced = exists().where(ProductModel.image_url == ImageBlob.url)
+
+    # Счётчик мог разойтись с реальностью (ручные правки БД) — чиним, а не удаляем
+    await session.execute(
+        update(ImageBlob)
+        .where(ImageBlob.ref_count <= 0, ImageBlob.updated_at < cutoff, referenced)
+        .values(
+            ref_count=select(func.count())
+            .where(ProductModel.image_url == ImageBlob.url)
+            .scalar_subquery()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+    total = 0
+    while True:
+        candidates = (
+            select(ImageBlob.digest)
+            .where(ImageBlob.ref_count <= 0, ImageBlob.updated_at < cutoff, ~referenced)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = await session.execute(
+            delete(ImageBlob)
+            .where(
+                ImageBlob.digest.in_(candidates),
+                ImageBlob.ref_count <= 0,
+                ImageBlob.updated_at < cutoff,
+            )
+            .returning(ImageBlob.digest, ImageBlob.url)
+            .execution_options(synchronize_session=False)
+        )
+        removed = result.all()
+        for digest, url in removed:
+            ext = url.rsplit(".", 1)[-1]
+            await run_in_threadpool(delete_blob_files, digest, ext)
+        await session.commit()
+
+        total += len(removed)
+        if len(removed) < batch_size:
+            return total
+
+
+async def collect_orphan_files(
+    session: AsyncSession,
+    batch_size: int = settings.blob_gc_batch,
+    grace: float = settings.blob_gc_grace,
+) -> int:
+    """
+    Удаляет файлы хранилища, на которые нет строки блоба (или ссылки товара
+    для загрузок старого формата), и брошенные временные файлы.
+    """
+    stale: List[Path] = await run_in_threadpool(lambda: list(iter_stale_files(grace)))
+    upload_dir = UPLOAD_DIR.resolve()
+
+    total = 0
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        temp = [p for p in batch if p.name.startswith(TEMP_PREFIX)]
+        legacy = {
+            f"{UPLOAD_URL}/{p.name}": p
+            for p in batch
+            if p not in temp and p.resolve().parent == upload_dir
+        }
+        sharded = {p.stem: p for p in batch if p not in temp and p.resolve().parent != upload_dir}
+
+        known_digests = set()
+        if sharded:
+            result = await session.execute(
+                select(ImageBlob.digest).where(ImageBlob.digest.in_(list(sharded)))
+            )
+            known_digests = set(result.scalars())
+        referenced_urls = set()
+        if legacy:
+            result = await session.execute(
+                select(ProductModel.image_url).where(ProductModel.image_url.in_(list(legacy)))
+            )
+            referenced_urls = set(result.scalars())
+
+        orphans = temp
+        orphans += [p for digest, p in sharded.items() if digest not in known_digests]
+        orphans += [p for url, p in legacy.items() if url not in referenced_urls]
+        for path in orphans:
+            await run_in_threadpool(delete_upload_file, path)
+        total += len(orphans)
+    return total
+
+
+async def blob_gc(
+    interval: float = settings.blob_gc_interval,
+) -> None:
+    """Фоновая задача: периодически собирает мусор в хранилище изображений"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                blobs = await collect_unreferenced_blobs(session)
+                files = await collect_orphan_files(session)
+            if blobs or files:
+                logger.info(f"🧹 Удалено неиспользуемых изображений: {blobs}, файлов-сирот: {files}")
+        except Exception as e:
+            logger.exception(f"❌ Ошибка сборки мусора изображений: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,318 @@
+# services/notification_service.py
+"""
+Воркер outbox уведомлений в Telegram.
+
+Обработчики запросов только пишут строку в notification_outbox
+(utils.telegram.enqueue_telegram_message). Воркер в фоне:
+- забирает пачку готовых к отправке строк атомарным UPDATE ... RETURNING
+  (аренда через next_attempt_at, поэтому упавший воркер не теряет сообщения);
+- склеивает всплески сообщений одного чата в сводку;
+- соблюдает лимит на чат через token bucket;
+- при ошибках повторяет с экспоненциальной задержкой; сводку, которую
+  Telegram отверг как некорректную (BadRequest), досылает по одной строке,
+  чтобы штраф получило только виновное сообщение.
+
+Результат каждой отправки (sent или перенос) коммитится сразу, до следующего
+обращения к Telegram: во время сетевого вызова транзакция не открыта
+(в SQLite она держала бы блокировку записи для всех запросов API), а после
+падения воркера уже доставленные сообщения не уходят повторно.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from telegram.error import BadRequest, RetryAfter
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.notification import NotificationOutbox
+from utils.telegram import close_bot, send_telegram_message
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+# Сколько строка остаётся за воркером, прежде чем её сможет забрать другой
+CLAIM_LEASE = timedelta(minutes=5)
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 600.0
+
+
+def _backoff(attempts: int) -> float:
+    return min(BACKOFF_BASE ** attempts, BACKOFF_MAX)
+
+
+def _retry_after(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        retry_after = retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def build_digests(items: List[Tuple[int, str]]) -> List[Tuple[str, List[int]]]:
+    """
+    Склеивает сообщения (id, текст) в сводки, не превышающие лимит Telegram.
+    Возвращает (текст сводки, id вошедших строк). Одиночное сообщение — как есть.
+    """
+    limit = MAX_MESSAGE_LENGTH - 100  # запас под заголовок сводки
+    chunks: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    length = 0
+    for item_id, text in items:
+        text = text[:limit]
+        added = len(text) + (len(DIGEST_SEPARATOR) if current else 0)
+        if current and length + added > limit:
+            chunks.append(current)
+            current, length = [], 0
+            added = len(text)
+        current.append((item_id, text))
+        length += added
+    if current:
+        chunks.append(current)
+
+    digests = []
+    for chunk in chunks:
+        texts = [text for _, text in chunk]
+        if len(chunk) == 1:
+            body = texts[0]
+        else:
+            body = f"📬 *Сводка: {len(chunk)} уведомл.*\n\n" + DIGEST_SEPARATOR.join(texts)
+        digests.append((body, [item_id for item_id, _ in chunk]))
+    return digests
+
+
+class NotificationWorker:
+    """Фоновая отправка уведомлений из outbox"""
+
+    def __init__(self) -> None:
+        self.buckets: Dict[str, TokenBucket] = defaultdict(
+            lambda: TokenBucket(settings.notify_rate_per_chat, settings.notify_burst)
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await close_bot()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.process_batch()
+            except Exception as e:
+                logger.exception(f"❌ Ошибка воркера уведомлений: {e}")
+            await asyncio.sleep(settings.notify_poll_interval)
+
+    async def process_batch(self) -> int:
+        """Забирает и отправляет одну пачку. Возвращает число отправленных строк."""
+        async with AsyncSessionLocal() as session:
+            now = datetime.now(timezone.utc)
+            due = (
+                select(NotificationOutbox.id)
+                .where(
+                    NotificationOutbox.status.in_(("pending", "sending")),
+                    NotificationOutbox.next_attempt_at <= now,
+                )
+                .order_by(NotificationOutbox.id)
+                .limit(settings.notify_batch_size)
+            )
+            result = await session.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id.in_(due),
+                    NotificationOutbox.next_attempt_at <= now,
+                )
+                .values(status="sending", next_attempt_at=now + CLAIM_LEASE)
+                .returning(
+                    NotificationOutbox.id,
+                    NotificationOutbox.chat_id,
+                    NotificationOutbox.parse_mode,
+                    NotificationOutbox.text,
+                    NotificationOutbox.attempts,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            rows = sorted(result.all(), key=lambda row: row.id)
+            await session.commit()
+
+            groups: Dict[Tuple[str, Optional[str]], list] = defaultdict(list)
+            for row in rows:
+                groups[(row.chat_id, row.parse_mode)].append(row)
+
+            sent = 0
+            for (chat_id, parse_mode), group in groups.items():
+                sent += await self._send_group(session, chat_id, parse_mode, group)
+            return sent
+
+    async def _send_group(self, session, chat_id: str, parse_mode: Optional[str], rows) -> int:
+        bucket = self.buckets[chat_id]
+        attempts = max(row.attempts for row in rows) + 1
+        by_id = {row.id: row for row in rows}
+        digests = build_digests([(row.id, row.text) for row in rows])
+
+        sent = 0
+        for position, (digest, ids) in enumerate(digests):
+            # Всё, что ещё не отправлено, при неудаче возвращается в очередь
+            pending_ids = [i for _, chunk in digests[position:] for i in chunk]
+
+            if not bucket.try_acquire():
+                # Лимит чата исчерпан — вернём строки в очередь без штрафа
+                await self._reschedule(session, pending_ids, delay=1.0 / bucket.rate, penalize=False)
+                break
+            try:
+                await send_telegram_message(digest, parse_mode=parse_mode, chat_id=chat_id)
+            except RetryAfter as e:
+                await self._reschedule(session, pending_ids, delay=_retry_after(e), penalize=False)
+                break
+            except BadRequest as e:
+                # Постоянная ошибка (обычно разметка одного сообщения или разрезанная
+                # сущность) — остальные строки сводки не виноваты: шлём по одной
+                logger.warning("Сводка для чата %s не принята (%s), отправляем по одной", chat_id, e)
+                done, finished = await self._send_singly(
+                    session, chat_id, parse_mode, [by_id[i] for i in ids], attempts
+                )
+                sent += done
+                if not finished:
+                    later = pending_ids[len(ids):]
+                    if later:
+                        await self._reschedule(session, later, delay=1.0 / bucket.rate, penalize=False)
+                    break
+                continue
+            except Exception as e:
+                logger.error("Ошибка отправки уведомлений в чат %s: %s", chat_id, e)
+                await self._reschedule(
+                    session,
+                    pending_ids,
+                    delay=_backoff(attempts),
+                    penalize=True,
+                    error=str(e),
+                )
+                break
+
+            await self._mark_sent(session, ids)
+            sent += len(ids)
+        return sent
+
+    async def _send_singly(
+        self,
+        session,
+        chat_id: str,
+        parse_mode: Optional[str],
+        rows,
+        attempts: int,
+    ) -> Tuple[int, bool]:
+        """
+        Отправляет строки по одной; сообщение с битой разметкой — простым текстом.
+        Штраф получает только строка, которую Telegram не принимает и так.
+        Возвращает (отправлено строк, дошли ли до конца без остановки группы).
+        """
+        bucket = self.buckets[chat_id]
+        sent = 0
+        for index, row in enumerate(rows):
+            rest = [r.id for r in rows[index:]]
+            if not bucket.try_acquire():
+                await self._reschedule(session, rest, delay=1.0 / bucket.rate, penalize=False)
+                return sent, False
+            text = row.text[:MAX_MESSAGE_LENGTH]
+            try:
+                try:
+                    await send_telegram_message(text, parse_mode=parse_mode, chat_id=chat_id)
+                except BadRequest:
+                    if parse_mode is None:
+                        raise
+                    await send_telegram_message(text, parse_mode=None, chat_id=chat_id)
+            except RetryAfter as e:
+                await self._reschedule(session, rest, delay=_retry_after(e), penalize=False)
+                return sent, False
+            except BadRequest as e:
+                logger.error("Уведомление %s не принято Telegram: %s", row.id, e)
+                await self._reschedule(
+                    session, [row.id], delay=_backoff(attempts), penalize=True, error=str(e)
+                )
+                continue
+            except Exception as e:
+                logger.error("Ошибка отправки уведомлений в чат %s: %s", chat_id, e)
+                await self._reschedule(
+                    session, rest, delay=_backoff(attempts), penalize=True, error=str(e)
+                )
+                return sent, False
+
+            await self._mark_sent(session, [row.id])
+            sent += 1
+        return sent, True
+
+    async def _mark_sent(self, session, ids: List[int]) -> None:
+        await session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .values(status="sent", sent_at=datetime.now(timezone.utc), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    async def _reschedule(
+        self,
+        session,
+        ids: List[int],
+        delay: float,
+        penalize: bool,
+        error: Optional[str] = None,
+    ) -> None:
+        next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        values = {"status": "pending", "next_attempt_at": next_attempt_at}
+        if penalize:
+            values["attempts"] = NotificationOutbox.attempts + 1
+            values["last_error"] = (error or "")[:500]
+        await session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if penalize:
+            # Исчерпавшие попытки больше не отправляем
+            await session.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id.in_(ids),
+                    NotificationOutbox.attempts >= settings.notify_max_attempts,
+                )
+                .values(status="failed")
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+
+
+notification_worker = NotificationWorker()
@@ -0,0 +1,121 @@
+# services/order_service.py
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models.commerce import Cart, CartItem, Order, OrderItem
+from models.product import Product
+from schemas.commerce import OrderCreate
+from services.inventory_service import (
+    get_available_quantity,
+    held_by_others,
+    release_stock,
+    utcnow,
+)
+from utils.telegram import enqueue_telegram_message
+
+
+async def create_order_service(
+    user_id: int,
+    payload: OrderCreate,
+    session: AsyncSession,
+    notify: Optional[Callable[[Order], str]] = None,
+) -> Order:
+    """
+    Оформляет заказ из корзины в одной транзакции:
+    один SELECT корзины с товарами, один условный UPDATE остатков,
+    один INSERT заказа, один пакетный INSERT позиций, очистка корзины и её холдов.
+    notify строит текст уведомления — строка outbox коммитится вместе с заказом.
+    """
+    result = await session.execute(
+        select(
+            CartItem.cart_id,
+            CartItem.product_id,
+            CartItem.quantity,
+            Product.name,
+            Product.price_shmeckles,
+        )
+        .join(Cart, Cart.id == CartItem.cart_id)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(CartItem.product_id)
+    )
+    lines = result.all()
+    if not lines:
+        raise ValueError("Корзина пуста")
+
+    cart_id = lines[0].cart_id
+    needed: Dict[int, int] = {}
+    for line in lines:
+        needed[line.product_id] = needed.get(line.product_id, 0) + line.quantity
+
+    # Списываем остатки одним условным UPDATE: строка обновится, только если
+    # товара хватает с учётом холдов других корзин. Без read-modify-write.
+    requested = case(needed, value=Product.id)
+    free = Product.quantity - held_by_others(Product.id, cart_id, utcnow())
+    stock_result = await session.execute(
+        update(Product)
+        .where(Product.id.in_(list(needed)), free >= requested)
+        .values(quantity=Product.quantity - requested)
+        .execution_options(synchronize_session=False)
+    )
+    if stock_result.rowcount != len(needed):
+        await session.rollback()
+        raise ValueError(
+            "Недостаточно товара на складе: "
+            + ", ".join(await _short_products(session, cart_id, needed))
+        )
+
+    order = Order(
+        user_id=user_id,
+        total_amount=round(
+            sum(line.price_shmeckles * line.quantity for line in lines), 2
+        ),
+        delivery_address=payload.delivery_address,
+        phone=payload.phone,
+        status="pending",
+    )
+    session.add(order)
+    await session.flush()
+
+    # Фиксируем название и цену на момент покупки — одним пакетным INSERT
+    items = await session.scalars(
+        insert(OrderItem).returning(OrderItem),
+        [
+            {
+                "order_id": order.id,
+                "product_id": line.product_id,
+                "quantity": line.quantity,
+                "frozen_name": line.name,
+                "frozen_price": line.price_shmeckles,
+            }
+            for line in lines
+        ],
+    )
+    set_committed_value(order, "items", list(items))
+
+    await session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+    await release_stock(session, cart_id)
+    if notify is not None:
+        enqueue_telegram_message(session, notify(order))
+    await session.commit()
+    return order
+
+
+async def _short_products(
+    session: AsyncSession,
+    cart_id: int,
+    needed: Dict[int, int],
+) -> List[str]:
+    """Названия товаров, которых не хватает (только для сообщения об ошибке)"""
+    result = await session.execute(
+        select(Product.id, Product.name).where(Product.id.in_(list(needed)))
+    )
+    short = []
+    for row in result.all():
+        available = await get_available_quantity(session, row.id, cart_id)
+        if available < needed[row.id]:
+            short.append(f"{row.name} (доступно: {available} шт.)")
+    return short
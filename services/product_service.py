@@ -1,13 +1,33 @@
 # services/product_service.py
-from typing import Optional, List
+import logging
+from typing import Any, Callable, Dict, Optional, List, Sequence, Tuple
 
-from sqlalchemy import select, or_
+from sqlalchemy import Row, case, insert, null, select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from models.product import Product as ProductModel
+from core.cache import catalog_cache, catalog_miss_cache
+from core.category_registry import category_registry
+from core.catalog_version import catalog_version
 from models.category import Category as CategoryModel
+from models.product import Product as ProductModel
+from schemas import Product as ProductSchema
 from schemas import ProductCreate  # или from schemas.product import ProductCreate
+from services.cart_service import delete_product_cart_lines_service
+from services.facet_service import PRICE_CURRENCIES, ensure_facet_index, facet_index
+from services.media_service import release_product_images, retain_image, swap_product_image
+from services.search_service import get_search_backend
+from utils.pagination import encode_cursor, decode_cursor
+from utils.telegram import enqueue_telegram_message
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Тег всех закэшированных страниц списка товаров
+LISTS_TAG = "lists"
 
 
 async def get_all_products_service(
@@ -15,99 +35,369 @@ async def get_all_products_service(
     search: Optional[str] = None,
     currency: Optional[str] = None,
     sort_order: Optional[str] = None,
-) -> List[ProductModel]:
-    query = select(ProductModel).options(selectinload(ProductModel.category))
-
-    if search:
-        like = f"%{search}%"
-        query = query.where(
-            or_(
-                ProductModel.name.ilike(like),
-                ProductModel.description.ilike(like),
-            )
-        )
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    category_ids: Optional[Sequence[int]] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+) -> Tuple[List[ProductSchema], Optional[str]]:
+    """
+    Keyset-пагинация: возвращает (страница, курсор следующей страницы).
+    Порядок всегда дополняется id, чтобы он был строгим и стабильным.
+    Страницы кэшируются по нормализованным параметрам запроса.
 
+    Фильтры по категориям и цене (в валюте currency, по умолчанию шмекели)
+    считаются по in-memory индексу фасетов; из БД читается только страница.
+    """
+    filters = _normalize_filters(currency, category_ids, price_min, price_max)
     if currency and sort_order:
-        if currency not in ("shmeckles", "flurbos", "credits"):
+        if currency not in PRICE_CURRENCIES:
             raise ValueError("currency должен быть shmeckles, flurbos или credits")
 
         if sort_order not in ("asc", "desc"):
             raise ValueError("sort_order должен быть asc или desc")
+    else:
+        currency = sort_order = None
 
-        column = getattr(ProductModel, f"price_{currency}")
-        if sort_order == "desc":
-            column = column.desc()
-        query = query.order_by(column)
+    search = " ".join(search.lower().split()) if search else None
+    cache_key = ("list", search, currency, sort_order, limit, cursor, filters)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    result = await session.execute(query)
-    return result.scalars().all()
+    if filters is not None and not search:
+        products, next_cursor = await _fetch_indexed_page(
+            session, filters, currency, sort_order, limit, cursor
+        )
+    else:
+        products, next_cursor = await _fetch_products_page(
+            session, search, currency, sort_order, limit, cursor, filters
+        )
+    await category_registry.ensure(session, {p.category_id for p in products}, referenced=True)
+    # Категории нет и в основной БД — её удалили вместе с товарами после чтения страницы
+    orphans = [p.id for p in products if category_registry.get(p.category_id) is None]
+    if orphans:
+        logger.warning(f"⚠️ Товары без категории пропущены в выдаче: {orphans}")
+        products = [p for p in products if category_registry.get(p.category_id) is not None]
+    page = ([ProductSchema.model_validate(p) for p in products], next_cursor)
 
+    tags = {LISTS_TAG}
+    for product in products:
+        tags.add(f"product:{product.id}")
+        tags.add(f"category:{product.category_id}")
+    catalog_cache.set(cache_key, page, tags=tags)
+    return page
 
-async def get_product_by_id_service(
+
+async def _fetch_products_page(
+    session: AsyncSession,
+    search: Optional[str],
+    currency: Optional[str],
+    sort_order: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    filters: Optional[Tuple] = None,
+) -> Tuple[List[ProductModel], Optional[str]]:
+    search_match = None
+    if search:
+        search_match = get_search_backend(session).match(search)
+        if search_match is None:
+            return [], None
+
+    # Ключ сортировки: цена, релевантность поиска или просто id
+    sort_column = None
+    descending = False
+    if currency:
+        sort_column = getattr(ProductModel, f"price_{currency}")
+        sort_key = f"{sort_column.key}:{sort_order}"
+        descending = sort_order == "desc"
+    elif search_match is not None:
+        sort_column = search_match.c.rank
+        sort_key = "rank:asc"
+    else:
+        sort_key = "id:asc"
+
+    if sort_column is None:
+        query = select(ProductModel)
+    else:
+        query = select(ProductModel, sort_column)
+
+    if search_match is not None:
+        query = query.join(search_match, search_match.c.product_id == ProductModel.id)
+
+    # Поиск + фильтры: индекс не знает результатов поиска, фильтруем в SQL
+    if filters is not None:
+        category_ids, price_currency, price_min, price_max = filters
+        price_column = getattr(ProductModel, f"price_{price_currency}")
+        if category_ids:
+            query = query.where(ProductModel.category_id.in_(category_ids))
+        if price_min is not None:
+            query = query.where(price_column >= price_min)
+        if price_max is not None:
+            query = query.where(price_column <= price_max)
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, sort_key)
+        if sort_column is None:
+            query = query.where(ProductModel.id > last_id)
+        elif descending:
+            query = query.where(
+                or_(
+                    sort_column < last_value,
+                    and_(sort_column == last_value, ProductModel.id < last_id),
+                )
+            )
+        else:
+            query = query.where(
+                or_(
+                    sort_column > last_value,
+                    and_(sort_column == last_value, ProductModel.id > last_id),
+                )
+            )
+
+    if sort_column is None:
+        query = query.order_by(ProductModel.id)
+    elif descending:
+        query = query.order_by(sort_column.desc(), ProductModel.id.desc())
+    else:
+        query = query.order_by(sort_column, ProductModel.id)
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    result = await session.execute(query.limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        last_value = last[1] if sort_column is not None else None
+        next_cursor = encode_cursor(sort_key, last_value, last[0].id)
+
+    return [row[0] for row in rows], next_cursor
+
+
+def _normalize_filters(
+    currency: Optional[str],
+    category_ids: Optional[Sequence[int]],
+    price_min: Optional[float],
+    price_max: Optional[float],
+) -> Optional[Tuple]:
+    """
+    Проверяет фильтры каталога и приводит их к хешируемому виду
+    (для ключа кэша). None — фильтров нет.
+    """
+    if not category_ids and price_min is None and price_max is None:
+        return None
+    if currency and currency not in PRICE_CURRENCIES:
+        raise ValueError("currency должен быть shmeckles, flurbos или credits")
+    if price_min is not None and price_max is not None and price_min > price_max:
+        raise ValueError("price_min не может быть больше price_max")
+    return (
+        tuple(sorted(set(category_ids or ()))),
+        currency or "shmeckles",
+        price_min,
+        price_max,
+    )
+
+
+async def _fetch_indexed_page(
+    session: AsyncSession,
+    filters: Tuple,
+    currency: Optional[str],
+    sort_order: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[ProductModel], Optional[str]]:
+    """Страница по индексу фасетов: id выбирает индекс, строки — один SELECT по id"""
+    index = await ensure_facet_index(session)
+    sort_key = f"price_{currency}:{sort_order}" if currency else "id:asc"
+    after = decode_cursor(cursor, sort_key) if cursor else None
+
+    ids, values = index.page(
+        index.match(*filters), currency, sort_order == "desc", after, limit
+    )
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        last_value = values[limit - 1] if values is not None else None
+        next_cursor = encode_cursor(sort_key, last_value, ids[-1])
+
+    if not ids:
+        return [], None
+    result = await session.execute(select(ProductModel).where(ProductModel.id.in_(ids)))
+    by_id = {product.id: product for product in result.scalars()}
+    return [by_id[i] for i in ids if i in by_id], next_cursor
+
+
+async def get_product_facets_service(
+    session: AsyncSession,
+    currency: Optional[str] = None,
+    category_ids: Optional[Sequence[int]] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Фасеты каталога: число товаров по категориям и гистограмма цен"""
+    if currency and currency not in PRICE_CURRENCIES:
+        raise ValueError("currency должен быть shmeckles, flurbos или credits")
+    _normalize_filters(currency, category_ids, price_min, price_max)
+    index = await ensure_facet_index(session)
+    return index.facets(category_ids, currency or "shmeckles", price_min, price_max)
+
+
+async def get_product_row(
     session: AsyncSession,
     product_id: int,
-) -> Optional[ProductModel]:
-    query = (
-        select(ProductModel)
-        .options(selectinload(ProductModel.category))
+) -> Optional[Row]:
+    """
+    Товар одной строкой (без ORM-объекта) вместе с названием категории —
+    один запрос с JOIN. Без кэша: подходит и для путей записи.
+    """
+    result = await session.execute(
+        select(ProductModel.__table__, CategoryModel.name.label("category_name"))
+        .join(CategoryModel, CategoryModel.id == ProductModel.category_id)
         .where(ProductModel.id == product_id)
     )
-    result = await session.execute(query)
-    return result.scalars().first()
+    return result.first()
+
+
+async def get_product_by_id_service(
+    session: AsyncSession,
+    product_id: int,
+) -> Optional[ProductSchema]:
+    """
+    Карточка товара: из кэша — без обращения к БД, иначе один запрос.
+    Отсутствие товара тоже кэшируется (в catalog_miss_cache, на
+    product_not_found_ttl): боты перебирают несуществующие id.
+    """
+    cache_key = ("product", product_id)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if catalog_miss_cache.get(product_id) is not None:
+        return None
+
+    row = await get_product_row(session, product_id)
+    if row is None:
+        catalog_miss_cache.set(product_id, True)
+        return None
+
+    schema = ProductSchema.model_validate(
+        {**row._mapping, "category": {"id": row.category_id, "name": row.category_name}}
+    )
+    catalog_cache.set(
+        cache_key,
+        schema,
+        tags=(f"product:{row.id}", f"category:{row.category_id}"),
+    )
+    return schema
+
+
+def invalidate_product_cache(product_id: int, lists: bool = True) -> None:
+    """
+    Сбрасывает кэш товара и страниц, где он встречается, и сдвигает версию каталога.
+    lists=True — дополнительно все списки (товар мог сменить место в выдаче).
+    """
+    tags = [f"product:{product_id}"]
+    if lists:
+        tags.append(LISTS_TAG)
+    catalog_cache.invalidate_tags(*tags)
+    catalog_version.bump()
+
+
+def invalidate_category_cache(category_id: int, lists: bool = False) -> None:
+    """
+    Сбрасывает кэш товаров категории (в ответе вложено имя категории)
+    и сдвигает версию каталога.
+    """
+    tags = [f"category:{category_id}"]
+    if lists:
+        tags.append(LISTS_TAG)
+    catalog_cache.invalidate_tags(*tags)
+    catalog_version.bump()
 
 
 async def create_product_service(
     session: AsyncSession,
     product_data: ProductCreate,
+    notify: Optional[Callable[[ProductModel], str]] = None,
 ) -> ProductModel:
-    category = await session.get(CategoryModel, product_data.category_id)
-    if category is None:
+    """
+    notify строит текст уведомления по созданному товару: строка outbox
+    коммитится вместе с товаром.
+    """
+    await category_registry.ensure(session, [product_data.category_id])
+    if category_registry.get(product_data.category_id) is None:
         raise ValueError("Категория не найдена")
 
-    new_product = ProductModel(**product_data.model_dump())
-    session.add(new_product)
+    try:
+        # INSERT ... RETURNING: строка со значениями по умолчанию без refresh
+        new_product = await session.scalar(
+            insert(ProductModel).values(**product_data.model_dump()).returning(ProductModel)
+        )
+    except IntegrityError:
+        # FK: категорию успели удалить после проверки по реестру
+        raise ValueError("Категория не найдена")
+    await get_search_backend(session).index_product(session, new_product)
+    await retain_image(session, new_product.image_url)
+    if notify is not None:
+        enqueue_telegram_message(session, notify(new_product))
     await session.commit()
-    await session.refresh(new_product)
-
-    query = (
-        select(ProductModel)
-        .options(selectinload(ProductModel.category))
-        .where(ProductModel.id == new_product.id)
-    )
-    result = await session.execute(query)
-    return result.scalars().first()
+    catalog_cache.invalidate_tags(LISTS_TAG)
+    # На случай закэшированного 404 по этому id
+    catalog_miss_cache.invalidate(new_product.id)
+    catalog_version.bump()
+    facet_index.upsert_product(new_product)
+    return new_product
 
 
 async def update_product_service(
     session: AsyncSession,
     product_id: int,
     product_data: ProductCreate,
+    notify: Optional[Callable[[ProductModel], str]] = None,
 ) -> ProductModel:
-    product = await session.get(ProductModel, product_id)
-    if product is None:
-        raise ValueError("Продукт не найден")
-
     data = product_data.model_dump()
 
     new_category_id = data.get("category_id")
     if new_category_id is not None:
-        category = await session.get(CategoryModel, new_category_id)
-        if category is None:
+        await category_registry.ensure(session, [new_category_id])
+        if category_registry.get(new_category_id) is None:
             raise ValueError("Категория не найдена")
 
-    for field, value in data.items():
-        setattr(product, field, value)
+    image_url = data.get("image_url")
+    await swap_product_image(session, product_id, image_url)
+    try:
+        product = await session.scalar(
+            update(ProductModel)
+            .where(ProductModel.id == product_id)
+            .values(
+                **data,
+                # Варианты старого изображения больше не подходят — их построят заново
+                # (в SET столбцы ещё имеют старые значения)
+                image_variants=case(
+                    (
+                        ProductModel.image_url.is_not_distinct_from(image_url),
+                        ProductModel.image_variants,
+                    ),
+                    else_=null(),
+                ),
+            )
+            .returning(ProductModel)
+        )
+    except IntegrityError:
+        raise ValueError("Категория не найдена")
+    if product is None:
+        # Откатываем и перевешивание ссылки на изображение
+        await session.rollback()
+        raise ValueError("Продукт не найден")
 
+    await get_search_backend(session).index_product(session, product)
+    if notify is not None:
+        enqueue_telegram_message(session, notify(product))
     await session.commit()
-    await session.refresh(product)
-
-    query = (
-        select(ProductModel)
-        .options(selectinload(ProductModel.category))
-        .where(ProductModel.id == product_id)
-    )
-    result = await session.execute(query)
-    return result.scalars().first()
+    invalidate_product_cache(product_id)
+    facet_index.upsert_product(product)
+    return product
 
 
 async def delete_product_service(
@@ -118,5 +408,10 @@ async def delete_product_service(
     if product is None:
         raise ValueError("Продукт не найден")
 
+    await get_search_backend(session).remove_product(session, product_id)
+    await delete_product_cart_lines_service([product_id], session)
+    await release_product_images(session, [product_id])
     await session.delete(product)
     await session.commit()
+    invalidate_product_cache(product_id)
+    facet_index.remove(product_id)
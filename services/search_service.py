@@ -0,0 +1,265 @@
+# services/search_service.py
+"""
+Полнотекстовый поиск товаров.
+
+Один интерфейс поверх двух движков:
+- SQLite: виртуальная таблица FTS5, слова хранятся уже в виде основ
+  (utils.stemmer), ранжирование через bm25();
+- Postgres: таблица product_search с tsvector и GIN-индексом,
+  конфигурация 'russian', ранжирование через ts_rank_cd().
+
+match() возвращает подзапрос (product_id, rank), где меньший rank —
+более релевантный товар.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Optional, Sequence, Union
+
+from sqlalchemy import Float, Integer, bindparam, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.sql import Subquery
+
+from models.product import Product as ProductModel
+from utils.stemmer import stem_tokens
+
+
+Executor = Union[AsyncSession, AsyncConnection]
+
+
+class SearchBackend(ABC):
+    """Базовый интерфейс поискового движка"""
+
+    table_name: str
+
+    @abstractmethod
+    async def ensure_schema(self, conn: AsyncConnection) -> None:
+        ...
+
+    @abstractmethod
+    async def index_product(self, session: Executor, product: ProductModel) -> None:
+        ...
+
+    @abstractmethod
+    async def index_products(self, session: Executor, products: Sequence[Any]) -> None:
+        """Индексирует пачку товаров (объекты или строки с id, name, description)"""
+
+    @abstractmethod
+    async def remove_product(self, session: Executor, product_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def rebuild(self, session: Executor) -> int:
+        ...
+
+    @abstractmethod
+    def match(self, query: str) -> Optional[Subquery]:
+        ...
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5 + стемминг на стороне приложения"""
+
+    table_name = "products_fts"
+
+    async def ensure_schema(self, conn: AsyncConnection) -> None:
+        await conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts "
+            "USING fts5(name, description, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        # Удаление товара (в т.ч. каскадом от категории) чистит индекс
+        await conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products "
+            "BEGIN DELETE FROM products_fts WHERE rowid = old.id; END"
+        ))
+
+    async def index_product(self, session: Executor, product: ProductModel) -> None:
+        await self.remove_product(session, product.id)
+        await session.execute(
+            text(
+                "INSERT INTO products_fts (rowid, name, description) "
+                "VALUES (:id, :name, :description)"
+            ),
+            {
+                "id": product.id,
+                "name": " ".join(stem_tokens(product.name)),
+                "description": " ".join(stem_tokens(product.description)),
+            },
+        )
+
+    async def index_products(self, session: Executor, products: Sequence[Any]) -> None:
+        if not products:
+            return
+        await session.execute(
+            text("DELETE FROM products_fts WHERE rowid IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": [p.id for p in products]},
+        )
+        await session.execute(
+            text(
+                "INSERT INTO products_fts (rowid, name, description) "
+                "VALUES (:id, :name, :description)"
+            ),
+            [
+                {
+                    "id": p.id,
+                    "name": " ".join(stem_tokens(p.name)),
+                    "description": " ".join(stem_tokens(p.description)),
+                }
+                for p in products
+            ],
+        )
+
+    async def remove_product(self, session: Executor, product_id: int) -> None:
+        await session.execute(
+            text("DELETE FROM products_fts WHERE rowid = :id"),
+            {"id": product_id},
+        )
+
+    async def rebuild(self, session: Executor) -> int:
+        await session.execute(text("DELETE FROM products_fts"))
+        result = await session.execute(
+            select(ProductModel.id, ProductModel.name, ProductModel.description)
+        )
+        rows = [
+            {
+                "id": row.id,
+                "name": " ".join(stem_tokens(row.name)),
+                "description": " ".join(stem_tokens(row.description)),
+            }
+            for row in result
+        ]
+        if rows:
+            await session.execute(
+                text(
+                    "INSERT INTO products_fts (rowid, name, description) "
+                    "VALUES (:id, :name, :description)"
+                ),
+                rows,
+            )
+        return len(rows)
+
+    def match(self, query: str) -> Optional[Subquery]:
+        stems = stem_tokens(query)
+        if not stems:
+            return None
+        # Каждая основа — префиксный терм, все термы через AND
+        fts_query = " ".join(f'"{s}"*' for s in stems)
+        return (
+            text(
+                "SELECT rowid AS product_id, bm25(products_fts, 10.0, 1.0) AS rank "
+                "FROM products_fts WHERE products_fts MATCH :fts_query"
+            )
+            .bindparams(fts_query=fts_query)
+            .columns(product_id=Integer, rank=Float)
+            .subquery("search")
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector + GIN, стемминг конфигурацией 'russian'"""
+
+    table_name = "product_search"
+
+    DOCUMENT_SQL = (
+        "setweight(to_tsvector('russian', coalesce(:name, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(:description, '')), 'B')"
+    )
+
+    async def ensure_schema(self, conn: AsyncConnection) -> None:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS product_search ("
+            "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_product_search_document "
+            "ON product_search USING GIN (document)"
+        ))
+
+    async def index_product(self, session: Executor, product: ProductModel) -> None:
+        await session.execute(
+            text(
+                "INSERT INTO product_search (product_id, document) "
+                f"VALUES (:id, {self.DOCUMENT_SQL}) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = excluded.document"
+            ),
+            {"id": product.id, "name": product.name, "description": product.description},
+        )
+
+    async def index_products(self, session: Executor, products: Sequence[Any]) -> None:
+        if not products:
+            return
+        await session.execute(
+            text(
+                "INSERT INTO product_search (product_id, document) "
+                f"VALUES (:id, {self.DOCUMENT_SQL}) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = excluded.document"
+            ),
+            [{"id": p.id, "name": p.name, "description": p.description} for p in products],
+        )
+
+    async def remove_product(self, session: Executor, product_id: int) -> None:
+        await session.execute(
+            text("DELETE FROM product_search WHERE product_id = :id"),
+            {"id": product_id},
+        )
+
+    async def rebuild(self, session: Executor) -> int:
+        await session.execute(text("DELETE FROM product_search"))
+        result = await session.execute(text(
+            "INSERT INTO product_search (product_id, document) "
+            "SELECT id, "
+            "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B') "
+            "FROM products"
+        ))
+        return result.rowcount
+
+    def match(self, query: str) -> Optional[Subquery]:
+        if not query.strip():
+            return None
+        return (
+            text(
+                "SELECT product_id, -ts_rank_cd(document, q) AS rank "
+                "FROM product_search, websearch_to_tsquery('russian', :query) AS q "
+                "WHERE document @@ q"
+            )
+            .bindparams(query=query)
+            .columns(product_id=Integer, rank=Float)
+            .subquery("search")
+        )
+
+
+_BACKENDS = {
+    "sqlite": SqliteSearchBackend(),
+    "postgresql": PostgresSearchBackend(),
+}
+
+
+def get_search_backend(bind: Executor) -> SearchBackend:
+    """Выбирает движок по диалекту подключения"""
+    if isinstance(bind, AsyncSession):
+        dialect = bind.get_bind().dialect.name
+    else:
+        dialect = bind.dialect.name
+    try:
+        return _BACKENDS[dialect]
+    except KeyError:
+        raise RuntimeError(f"Полнотекстовый поиск не поддерживается для {dialect}")
+
+
+async def init_search_index(conn: AsyncConnection) -> None:
+    """
+    Создаёт поисковые структуры и заполняет индекс, если он пуст
+    (например, после seed_db или первой миграции).
+    """
+    backend = get_search_backend(conn)
+    await backend.ensure_schema(conn)
+
+    indexed = (
+        await conn.execute(text(f"SELECT count(*) FROM {backend.table_name}"))
+    ).scalar_one()
+    total = (await conn.execute(text("SELECT count(*) FROM products"))).scalar_one()
+    if indexed == 0 and total > 0:
+        await backend.rebuild(conn)
@@ -0,0 +1,119 @@
+"""
+Генерация и выбор производных изображений.
+
+Модуль намеренно не импортирует ничего из приложения: render_variants
+выполняется в дочерних процессах пула, и им не нужны ни настройки,
+ни подключение к БД.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+# Ширины вариантов, px
+VARIANT_WIDTHS: Tuple[int, ...] = (320, 640, 1280)
+
+# Форматы в порядке предпочтения; jpeg — запасной для старых клиентов
+_QUALITY = {"avif": 50, "webp": 75, "jpeg": 80}
+_MIME = {"avif": "image/avif", "webp": "image/webp"}
+
+
+def supported_formats() -> Tuple[str, ...]:
+    """Форматы, которые умеет кодировать установленный Pillow"""
+    formats = []
+    if features.check("avif"):
+        formats.append("avif")
+    if features.check("webp"):
+        formats.append("webp")
+    formats.append("jpeg")
+    return tuple(formats)
+
+
+def _save_atomic(image: Image.Image, target: Path, fmt: str) -> None:
+    # Уникальный временный файл: один исходник могут рендерить несколько
+    # процессов сразу (товары с общим image_url), и каждый пишет целиком свой
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format=fmt.upper(), quality=_QUALITY[fmt])
+        os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def render_variants(
+    source: str,
+    out_dir: str,
+    url_prefix: str,
+    widths: Iterable[int] = VARIANT_WIDTHS,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Строит уменьшенные копии source во всех поддерживаемых форматах.
+    Картинки не увеличиваются: ширины больше исходной заменяются исходной.
+    Возвращает {формат: {ширина: url}}.
+
+    Выполняется в пуле процессов.
+    """
+    source_path = Path(source)
+    target_dir = Path(out_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        src_width = original.width
+        targets = sorted({min(width, src_width) for width in widths})
+
+        variants: Dict[str, Dict[str, str]] = {}
+        for width in targets:
+            height = max(1, round(original.height * width / src_width))
+            resized = original.resize((width, height), Image.LANCZOS) if width != src_width else original
+            if resized.mode not in ("RGB", "RGBA"):
+                resized = resized.convert("RGBA" if "transparency" in resized.info else "RGB")
+
+            for fmt in supported_formats():
+                image = resized
+                if fmt == "jpeg" and image.mode == "RGBA":
+                    # JPEG без альфа-канала — подкладываем белый фон
+                    background = Image.new("RGB", image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+                filename = f"{source_path.stem}-{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+                _save_atomic(image, target_dir / filename, fmt)
+                variants.setdefault(fmt, {})[str(width)] = f"{url_prefix}/{filename}"
+    return variants
+
+
+def select_image_variant(
+    variants: Optional[Dict[str, Dict[str, str]]],
+    accept: Optional[str],
+    width: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Выбирает лучший вариант по заголовку Accept и желаемой ширине:
+    самый современный формат, который принимает клиент, и самую узкую
+    копию не уже width (или самую широкую, если таких нет).
+    """
+    if not variants:
+        return None
+    accept = (accept or "").lower()
+
+    for fmt in ("avif", "webp", "jpeg"):
+        by_width = variants.get(fmt)
+        if not by_width:
+            continue
+        if fmt in _MIME and _MIME[fmt] not in accept:
+            continue
+        widths = sorted(int(w) for w in by_width)
+        if width is None:
+            chosen = widths[-1]
+        else:
+            chosen = next((w for w in widths if w >= width), widths[-1])
+        return by_width[str(chosen)]
+    return None
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+from typing import Any, Optional, Tuple
+
+
+def encode_cursor(sort_key: str, value: Any, last_id: int) -> str:
+    """
+    Кодирует позицию последнего элемента страницы в непрозрачный курсор.
+
+    sort_key фиксирует режим сортировки, чтобы курсор нельзя было
+    применить к другому порядку выдачи.
+    """
+    payload = json.dumps(
+        {"s": sort_key, "v": value, "id": last_id},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str) -> Tuple[Any, int]:
+    """
+    Декодирует курсор и возвращает (значение сортировки, id).
+    Бросает ValueError, если курсор повреждён или от другой сортировки.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = data["v"], int(data["id"])
+        cursor_sort_key: Optional[str] = data["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("Некорректный cursor")
+
+    if cursor_sort_key != sort_key:
+        raise ValueError("cursor не соответствует параметрам сортировки")
+
+    return value, last_id
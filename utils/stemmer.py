@@ -0,0 +1,149 @@
+"""
+Русский стеммер (алгоритм Snowball) для полнотекстового поиска в SQLite.
+
+В Postgres стемминг делает встроенная конфигурация 'russian',
+а в FTS5 русского стеммера нет — поэтому приводим слова к основе сами
+и при индексации, и при поиске.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+VOWELS = "аеиоуыэюя"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+PERFECTIVE_GERUND: Tuple[Tuple[str, ...], Tuple[str, ...]] = (
+    ("вшись", "вши", "в"),
+    ("ывшись", "ившись", "ывши", "ивши", "ыв", "ив"),
+)
+ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+PARTICIPLE: Tuple[Tuple[str, ...], Tuple[str, ...]] = (
+    ("ем", "нн", "вш", "ющ", "щ"),
+    ("ивш", "ывш", "ующ"),
+)
+REFLEXIVE = ("ся", "сь")
+VERB: Tuple[Tuple[str, ...], Tuple[str, ...]] = (
+    ("ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет",
+     "ют", "ны", "ть", "й", "л", "н"),
+    ("уйте", "ейте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло",
+     "ено", "ует", "уют", "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл",
+     "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю"),
+)
+NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам",
+    "ом", "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)
+SUPERLATIVE = ("ейше", "ейш")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _region(word: str, start: int) -> int:
+    """Начало региона R после первой пары 'гласная + согласная'."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=None)
+def _longest_first(endings: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+@lru_cache(maxsize=None)
+def _grouped_longest_first(
+    groups: Tuple[Tuple[str, ...], Tuple[str, ...]],
+) -> Tuple[Tuple[str, bool], ...]:
+    candidates = [(e, True) for e in groups[0]] + [(e, False) for e in groups[1]]
+    return tuple(sorted(candidates, key=lambda c: len(c[0]), reverse=True))
+
+
+def _strip(word: str, rv: int, endings: Tuple[str, ...]) -> Optional[str]:
+    """Отрезает самое длинное окончание из endings, лежащее в RV."""
+    for ending in _longest_first(endings):
+        if word.endswith(ending) and len(word) - len(ending) >= rv:
+            return word[: -len(ending)]
+    return None
+
+
+def _strip_grouped(
+    word: str,
+    rv: int,
+    groups: Tuple[Tuple[str, ...], Tuple[str, ...]],
+) -> Optional[str]:
+    """
+    Окончания первой группы допустимы только после 'а' или 'я',
+    которые при этом остаются в основе.
+    """
+    for ending, needs_a in _grouped_longest_first(groups):
+        if not word.endswith(ending):
+            continue
+        stem = word[: -len(ending)]
+        if needs_a:
+            if len(stem) - 1 >= rv and stem[-1] in "ая":
+                return stem
+        elif len(stem) >= rv:
+            return stem
+    return None
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """
+    Возвращает основу слова. Нерусские слова только приводятся к нижнему регистру.
+    Словарь каталога невелик и повторяется, поэтому основы кэшируются
+    (массовый импорт и перестройка индекса стеммят сотни тысяч слов).
+    """
+    word = word.lower().replace("ё", "е")
+    if not any(ch in VOWELS for ch in word):
+        return word
+
+    rv = next(i for i, ch in enumerate(word) if ch in VOWELS) + 1
+    r2 = _region(word, _region(word, 0) - 1)
+
+    # Шаг 1
+    result = _strip_grouped(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        result = _strip(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _strip_grouped(result, rv, PARTICIPLE) or result
+        else:
+            result = _strip_grouped(word, rv, VERB) or _strip(word, rv, NOUN)
+    word = result if result is not None else word
+
+    # Шаг 2
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    for ending in DERIVATIONAL:
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            word = word[: -len(ending)]
+            break
+
+    # Шаг 4
+    if word.endswith("нн"):
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        return word[:-1] if word.endswith("нн") else word
+    if word.endswith("ь") and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def stem_tokens(text: Optional[str]) -> List[str]:
+    """Разбивает текст на слова и приводит каждое к основе."""
+    if not text:
+        return []
+    return [stem(token) for token in TOKEN_RE.findall(text)]
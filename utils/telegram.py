@@ -1,33 +1,80 @@
 import logging
+from datetime import datetime, timezone
+from typing import Optional
+
 import telegram
+from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from core.config import settings
+from models.notification import NotificationOutbox
 
 logging.basicConfig(level=logging.INFO)
 
+# Один бот (и один пул HTTP-соединений) на весь процесс
+_bot: Optional[telegram.Bot] = None
+
+
+def get_bot() -> telegram.Bot:
+    """Долгоживущий клиент Telegram с пулом соединений"""
+    global _bot
+    if _bot is None:
+        _bot = telegram.Bot(
+            token=settings.telegram_bot_api_key,
+            request=HTTPXRequest(connection_pool_size=4),
+        )
+    return _bot
+
+
+async def close_bot() -> None:
+    global _bot
+    if _bot is not None:
+        await _bot.shutdown()
+        _bot = None
+
 
-async def send_telegram_message(message: str, parse_mode: str = "Markdown") -> None:
+def escape_md(value: object) -> str:
+    """Экранирует пользовательские данные для parse_mode="Markdown" (_ * ` [)"""
+    return escape_markdown(str(value), version=1)
+
+
+def enqueue_telegram_message(
+    session: AsyncSession,
+    message: str,
+    parse_mode: Optional[str] = "Markdown",
+    chat_id: Optional[str] = None,
+) -> None:
     """
-    Отправка сообщения в Telegram через бота.
+    Ставит уведомление в outbox в транзакции запроса.
+    Отправкой занимается фоновый воркер (services.notification_service),
+    обработчик запроса не ждёт Telegram.
     """
-    try:
-        bot = telegram.Bot(token=settings.telegram_bot_api_key)
-
-        await bot.send_message(
-            chat_id=settings.telegram_user_id,
+    session.add(
+        NotificationOutbox(
+            chat_id=chat_id or settings.telegram_user_id,
             text=message,
             parse_mode=parse_mode,
+            status="pending",
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc),
         )
+    )
 
-        logging.info(
-            'Сообщение "%s" отправлено в чат %s',
-            message,
-            settings.telegram_user_id,
-        )
-    except Exception as e:
-        logging.error(
-            "Ошибка отправки сообщения в чат %s: %s",
-            settings.telegram_user_id,
-            e,
-        )
-        # по желанию можно пробросить дальше:
-        # raise
+
+async def send_telegram_message(
+    message: str,
+    parse_mode: Optional[str] = "Markdown",
+    chat_id: Optional[str] = None,
+) -> None:
+    """
+    Отправка сообщения в Telegram через общий бот.
+    Ошибки пробрасываются — повторы решает вызывающий код.
+    """
+    chat_id = chat_id or settings.telegram_user_id
+    await get_bot().send_message(
+        chat_id=chat_id,
+        text=message,
+        parse_mode=parse_mode,
+    )
+    logging.info('Сообщение "%s" отправлено в чат %s', message, chat_id)